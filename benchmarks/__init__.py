@@ -0,0 +1,10 @@
+'''
+Benchmarks of the level 4 and level 5 solutions on generated inputs.
+
+    python -m benchmarks.run -s default -o results.json
+    python -m benchmarks.compare old.json new.json
+    python -m benchmarks.exact
+    python -m benchmarks.incremental
+    python -m benchmarks.tiled
+    python -m benchmarks.routing
+'''
@@ -0,0 +1,67 @@
+'''
+Compares two benchmark results files phase by phase. Exits with status 1
+if a phase of a case got slower by more than the threshold.
+
+    python -m benchmarks.compare <oldresults> <newresults> -t <threshold>
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, json
+
+# Phases shorter than this (in seconds) are too noisy to compare
+MIN_SECONDS = 0.01
+
+
+def compare(old, new, threshold):
+    '''
+    Returns the rows (case, phase, old seconds, new seconds, ratio,
+    regressed) for every phase of the cases found in both results.
+    '''
+    rows = []
+    for name, case in new['cases'].items():
+        if name not in old['cases']:
+            continue
+        old_median = old['cases'][name]['median']
+        for phase, seconds in case['median'].items():
+            if phase not in old_median:
+                continue
+            ratio = seconds / old_median[phase] if old_median[phase] > 0 else float('inf')
+            regressed = ratio > 1 + threshold and seconds - old_median[phase] > MIN_SECONDS
+            rows.append((name, phase, old_median[phase], seconds, ratio, regressed))
+    return rows
+
+
+def main(argv):
+    threshold = 0.1
+    usage = 'Usage: python -m benchmarks.compare <oldresults> <newresults> -t <threshold> -h'
+    try:
+        opts, args = getopt.gnu_getopt(argv, "t:h")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == '-t':
+            threshold = float(arg)
+    if len(args) != 2:
+        print('ERROR.')
+        print(usage)
+        sys.exit(2)
+
+    with open(args[0]) as f:
+        old = json.load(f)
+    with open(args[1]) as f:
+        new = json.load(f)
+
+    rows = compare(old, new, threshold)
+    for name, phase, old_s, new_s, ratio, regressed in rows:
+        print('{:<60} {:<8} {:>10.4f} {:>10.4f} {:>7.2f}x {}'.format(
+            name, phase, old_s, new_s, ratio, 'REGRESSION' if regressed else ''))
+    if any(row[-1] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
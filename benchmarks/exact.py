@@ -0,0 +1,144 @@
+'''
+Checks the cells level 4 finds for random rays against a brute force
+reference in exact rational arithmetic, and counts the rays for which the
+float edge tests the solution used before give other cells. Exits with
+status 1 if the solution and the reference disagree on any ray.
+
+    python -m benchmarks.exact -n <rays> -s <seed> -g <gridsize>
+
+    Note:
+        - The reference takes every cell of the ray's quadrant (the x and
+        y on the side of the origin the direction points to) and clips the
+        ray's line to the cell's closed square with fractions. A ray with
+        direction (0, 0) visits its origin's column, like (0, 1).
+        - Small directions are drawn most of the time, they are the ones
+        that pass exactly through cell corners.
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, os, random
+from fractions import Fraction
+
+# Other imports
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'level_4'))
+from model import Ray, Point
+from batch import trace_rays
+
+# Coordinates of the rays checked one cell at a time far from the origin
+LARGE = 10 ** 9
+
+HALF = Fraction(1, 2)
+
+
+def crosses(ox, oy, dx, dy, x, y):
+    '''
+    Does the line through (ox, oy) with direction (dx, dy) touch the
+    closed square of the cell (x, y). Liang-Barsky clipping of the line
+    o + t * d, every bound is an exact fraction.
+    '''
+    if dx == 0 and dy == 0:
+        dx, dy = 0, 1
+    lo, hi = None, None
+    for o, d, c in ((ox, dx, x), (oy, dy, y)):
+        if d == 0:
+            if not c - HALF <= o <= c + HALF:
+                return False
+            continue
+        t1, t2 = Fraction(c - o, 1) / d - HALF / abs(d), Fraction(c - o, 1) / d + HALF / abs(d)
+        lo = t1 if lo is None else max(lo, t1)
+        hi = t2 if hi is None else min(hi, t2)
+    return lo is None or lo <= hi
+
+
+def reference_cells(ox, oy, dx, dy, rows, cols):
+    '''The set of the cells of the ray's quadrant its line touches.'''
+    xs = range(ox, rows) if dx >= 0 else range(0, ox + 1)
+    ys = range(oy, cols) if dy >= 0 else range(0, oy + 1)
+    return {(x, y) for x in xs for y in ys if crosses(ox, oy, dx, dy, x, y)}
+
+
+def float_cells(ray, rows, cols):
+    '''
+    The cells the float edge tests of the original Ray._visited accept,
+    checked over the same candidates.
+    '''
+    f, f_inv = ray.create_funs()
+    cells = set()
+    for cell in ray._iter_indexes(rows, cols):
+        bl, tr = Point(cell.x - 0.5, cell.y - 0.5), Point(cell.x + 0.5, cell.y + 0.5)
+        if f and (bl.y <= f(bl.x) <= tr.y or bl.y <= f(tr.x) <= tr.y):
+            cells.add(cell)
+        elif f_inv and (bl.x <= f_inv(bl.y) <= tr.x or bl.x <= f_inv(tr.y) <= tr.x):
+            cells.add(cell)
+    return cells
+
+
+def random_direction(rng):
+    bound = 9 if rng.random() < 0.8 else 1000
+    return rng.randint(-bound, bound), rng.randint(-bound, bound)
+
+
+def check(n, seed, size):
+    '''
+    Returns the number of rays on which the solution disagrees with the
+    reference, and on which the float tests do.
+    '''
+    rng = random.Random(seed)
+    wrong, float_wrong = 0, 0
+    for _ in range(n):
+        rows, cols = rng.randint(1, size), rng.randint(1, size)
+        ox, oy = rng.randrange(rows), rng.randrange(cols)
+        dx, dy = random_direction(rng)
+        ray = Ray(ox, oy, dx, dy)
+
+        expected = reference_cells(ox, oy, dx, dy, rows, cols)
+        cells = ray.get_cells(rows, cols)
+        _, xs, ys = trace_rays([[ox, oy]], [[dx, dy]], rows, cols)
+        if set(cells) != expected or cells != list(zip(xs.tolist(), ys.tolist())):
+            wrong += 1
+            print('Mismatch: ' + str(ray), file=sys.stderr)
+        if float_cells(ray, rows, cols) != expected:
+            float_wrong += 1
+
+    # far from zero only the cells around the line are tested
+    for _ in range(n):
+        ox, oy = rng.randint(LARGE - 1000, LARGE), rng.randint(LARGE - 1000, LARGE)
+        dx, dy = random_direction(rng)
+        ray = Ray(ox, oy, dx, dy)
+        t = rng.randint(0, 1000)
+        x, y = ox + t * dx + rng.randint(-2, 2), oy + t * dy + rng.randint(-2, 2)
+        if ray._visited(Point(x, y)) != crosses(ox, oy, dx, dy, x, y):
+            wrong += 1
+            print('Mismatch: {} at {}'.format(ray, (x, y)), file=sys.stderr)
+    return wrong, float_wrong
+
+
+def main(argv):
+    n, seed, size = 4000, 0, 30
+    usage = 'Usage: python -m benchmarks.exact -n <rays> -s <seed> -g <gridsize> -h'
+    try:
+        opts, args = getopt.getopt(argv, "n:s:g:h")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == '-n':
+            n = int(arg)
+        elif opt == '-s':
+            seed = int(arg)
+        elif opt == '-g':
+            size = int(arg)
+
+    wrong, float_wrong = check(n, seed, size)
+    print('{} of {} rays differ from the exact reference, the float tests differ on {} of the {} rays '
+          'in a grid'.format(wrong, n * 2, float_wrong, n))
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,119 @@
+'''
+    Note:
+        - Generated inputs follow the official formatting of the level and
+        are reproducible, the same parameters and seed give the same file.
+'''
+
+# Generic/Built-in Libs
+import numpy as np
+
+DIRECTIONS = ('uniform', 'axis', 'diagonal', 'repeated')
+SHAPES = ('voronoi', 'blocks')
+
+
+def level4_input(filename, rows, cols, rays, directions='uniform', max_dir=100, seed=0):
+    '''
+    Writes a level 4 input with a rows x cols grid and the given number of
+    rays with random origins.
+
+    params:
+        directions: 'uniform' - random directions in [-max_dir, max_dir]^2
+                    'axis' - directions parallel to one of the axes
+                    'diagonal' - directions (+-c, +-c)
+                    'repeated' - multiples of 16 random base directions
+    '''
+    rng = np.random.default_rng(seed)
+    origins = np.column_stack((rng.integers(0, rows + 1, rays), rng.integers(0, cols + 1, rays)))
+
+    if directions == 'uniform':
+        d = rng.integers(-max_dir, max_dir + 1, (rays, 2))
+    elif directions == 'axis':
+        c = rng.integers(1, max_dir + 1, rays) * rng.choice([-1, 1], rays)
+        on_x = rng.random(rays) < 0.5
+        d = np.column_stack((np.where(on_x, c, 0), np.where(on_x, 0, c)))
+    elif directions == 'diagonal':
+        c = rng.integers(1, max_dir + 1, rays)
+        d = np.column_stack((c * rng.choice([-1, 1], rays), c * rng.choice([-1, 1], rays)))
+    elif directions == 'repeated':
+        base = rng.integers(-9, 10, (16, 2))
+        d = base[rng.integers(0, 16, rays)] * rng.integers(1, max(2, max_dir // 9), (rays, 1))
+    else:
+        raise ValueError('unknown directions: ' + str(directions))
+
+    with open(filename, 'w') as f:
+        f.write('{} {}\n{}\n'.format(rows, cols, rays))
+        np.savetxt(f, np.column_stack((origins, d)), fmt='%d')
+
+
+def level5_input(filename, rows, cols, countries, solars, shape='voronoi', max_price=1000, seed=0):
+    '''
+    Writes a level 5 input with a rows x cols map split into about the
+    given number of countries, and the given number of solars. Raises a
+    ValueError if a country has no cell off its border (the map is too
+    small for that many countries).
+
+    params:
+        shape: 'voronoi' - the cells closest to a seed on a jittered lattice
+               'blocks' - rectangular tiles
+    returns:
+        the number of countries on the map
+    '''
+    rng = np.random.default_rng(seed)
+
+    # the lattice of countries follows the aspect of the map
+    nx = max(1, min(rows // 3, int(round(np.sqrt(countries * rows / cols)))))
+    ny = max(1, min(cols // 3, countries // nx))
+    xs, ys = np.arange(rows), np.arange(cols)
+
+    if shape == 'blocks':
+        cx = np.minimum(xs * nx // rows, nx - 1)
+        cy = np.minimum(ys * ny // cols, ny - 1)
+        country = cy[:, None] * nx + cx[None, :]
+    elif shape == 'voronoi':
+        # seeds move at most a quarter of a lattice cell, so the seed
+        # closest to a cell is always one of the 3 x 3 around its own
+        sx, sy = rows / nx, cols / ny
+        seed_x = (np.arange(nx)[None, :] + 0.5) * sx + rng.uniform(-sx / 4, sx / 4, (ny, nx))
+        seed_y = (np.arange(ny)[:, None] + 0.5) * sy + rng.uniform(-sy / 4, sy / 4, (ny, nx))
+        lx = np.minimum((xs / sx).astype(np.int64), nx - 1)
+        country = np.empty((cols, rows), dtype=np.int64)
+        for y in range(cols):
+            ly = min(int(y / sy), ny - 1)
+            best, best_d = None, None
+            for oy in (-1, 0, 1):
+                for ox in (-1, 0, 1):
+                    cx, cy = np.clip(lx + ox, 0, nx - 1), min(max(ly + oy, 0), ny - 1)
+                    d = (xs - seed_x[cy, cx]) ** 2 + (y - seed_y[cy, cx]) ** 2
+                    c = cy * nx + cx
+                    if best is None:
+                        best, best_d = c, d
+                    else:
+                        closer = (d < best_d) | ((d == best_d) & (c < best))
+                        best, best_d = np.where(closer, c, best), np.minimum(d, best_d)
+            country[y] = best
+    else:
+        raise ValueError('unknown shape: ' + str(shape))
+
+    n = nx * ny
+    if len(np.unique(country[_interior(country)])) != n:
+        raise ValueError('a country has no cell off its border, use fewer countries')
+
+    altitude = rng.integers(0, 100, (cols, rows))
+    solar_country = rng.integers(0, n, solars)
+    price = rng.integers(1, max_price + 1, solars)
+
+    with open(filename, 'w') as f:
+        f.write('{}\n'.format(solars))
+        np.savetxt(f, np.column_stack((solar_country, price)), fmt='%d')
+        f.write('{} {}\n'.format(rows, cols))
+        np.savetxt(f, np.stack((altitude, country), axis=2).reshape(cols, rows * 2), fmt='%d')
+    return n
+
+
+def _interior(country):
+    '''Mask of the cells whose four neighbours are in the same country.'''
+    interior = np.zeros(country.shape, dtype=bool)
+    c = country[1:-1, 1:-1]
+    interior[1:-1, 1:-1] = ((c == country[:-2, 1:-1]) & (c == country[2:, 1:-1]) &
+                            (c == country[1:-1, :-2]) & (c == country[1:-1, 2:]))
+    return interior
@@ -0,0 +1,151 @@
+'''
+Checks the level 5 incremental model against a model built again from
+scratch after every update, on random generated maps. Exits with status 1
+if they disagree after any update.
+
+    python -m benchmarks.incremental -n <maps> -u <updates> -s <seed>
+
+    Note:
+        - An update changes the prices of two solars, or moves a few
+        border cells to the country of a cell near them (now and then all
+        of them to one country). Moves that would leave a country without
+        a capital must be refused without changing the model.
+        - Every other map is solved with Dijkstra instead of the dense
+        kernel, so both ways of updating the distances are checked.
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, os, tempfile
+import numpy as np
+
+# Other imports
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'level_5'))
+from model import Matrix
+from incremental import Model
+import paths
+from common.reader import read_ints
+from benchmarks.generate import level5_input
+
+
+def random_map(path, rng, seed):
+    '''
+    Writes a small random map to path and returns its Matrix, solar
+    countries and prices, or None if the map has a country without a
+    capital.
+    '''
+    rows, cols = int(rng.integers(15, 40)), int(rng.integers(15, 40))
+    try:
+        level5_input(path, rows, cols, int(rng.integers(2, 12)), 5, seed=seed)
+    except ValueError:
+        return None
+    icparsed = read_ints(path)
+    k = int(icparsed[0])
+    solars = icparsed[1:k*2+1].reshape(k, 2)
+    rows, cols = int(icparsed[k*2+1]), int(icparsed[k*2+2])
+    cells = icparsed[k*2+3:k*2+3 + rows*cols*2].reshape(cols, rows, 2)
+    return Matrix.from_planes(cells[:, :, 0], cells[:, :, 1]), solars[:, 0], solars[:, 1]
+
+
+def update(model, rng):
+    '''Applies one random update to the model, returns False if it was refused.'''
+    matrix = model.matrix
+    if rng.random() < 0.3:
+        model.set_prices(rng.integers(0, len(model.prices), 2), rng.integers(0, 1000, 2))
+        return True
+
+    ys, xs = np.nonzero(matrix.border)
+    if rng.random() < 0.1:
+        # all the border cells to one country, usually refused
+        countries = rng.integers(0, len(model.capitals))
+    else:
+        pick = rng.integers(0, len(xs), int(rng.integers(1, 5)))
+        xs, ys = xs[pick], ys[pick]
+        near_x = np.clip(xs + rng.integers(-3, 4, len(xs)), 0, matrix.rows - 1)
+        near_y = np.clip(ys + rng.integers(-3, 4, len(xs)), 0, matrix.cols - 1)
+        countries = matrix.country[near_y, near_x].copy()
+    before = matrix.country.copy(), list(model.capitals), model.distances.copy()
+    try:
+        model.reassign_cells(xs, ys, countries)
+    except ValueError:
+        if not ((matrix.country == before[0]).all() and model.capitals == before[1]
+                and (model.distances == before[2]).all()):
+            raise AssertionError('a refused move changed the model')
+        return False
+    return True
+
+
+def differences(model, fresh):
+    '''Returns the names of the parts of the model that differ from fresh.'''
+    parts = {
+        'capitals': model.capitals == fresh.capitals,
+        'graph': all((getattr(model.graph, name) == getattr(fresh.graph, name)).all()
+                     for name in ('offsets', 'targets', 'weights')),
+        'border': (model.matrix.border == fresh.matrix.border).all(),
+        'interior': (model.matrix.interior == fresh.matrix.interior).all(),
+        'distances': (model.distances == fresh.distances).all(),
+        'costs': (model.costs == fresh.costs).all(),
+        'country_cells': all((model.country_cells[c] == cells).all() for c, cells in fresh.country_cells.items()),
+    }
+    return [name for name, same in parts.items() if not same]
+
+
+def check(n, updates, seed):
+    '''
+    Returns the number of updates after which the model differs from a
+    fresh one, the number of updates checked, and how many were refused.
+    '''
+    rng = np.random.default_rng(seed)
+    dense_max_nodes = paths.DENSE_MAX_NODES
+    wrong, checked, refused = 0, 0, 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(n):
+            paths.DENSE_MAX_NODES = dense_max_nodes if i % 2 == 0 else 0
+            generated = random_map(os.path.join(tmp, 'map.in'), rng, seed * n + i)
+            if generated is None:
+                continue
+            matrix, solar_countries, prices = generated
+            model = Model(matrix, solar_countries, prices)
+            for step in range(updates):
+                try:
+                    refused += not update(model, rng)
+                    fresh = Model(Matrix.from_planes(matrix.altitude.copy(), matrix.country.copy()),
+                                  solar_countries, model.prices)
+                    parts = differences(model, fresh)
+                except AssertionError as e:
+                    parts = [str(e)]
+                checked += 1
+                if parts:
+                    wrong += 1
+                    print('Mismatch: map {} update {}: {}'.format(i, step, ', '.join(parts)), file=sys.stderr)
+    paths.DENSE_MAX_NODES = dense_max_nodes
+    return wrong, checked, refused
+
+
+def main(argv):
+    n, updates, seed = 60, 15, 0
+    usage = 'Usage: python -m benchmarks.incremental -n <maps> -u <updates> -s <seed> -h'
+    try:
+        opts, args = getopt.getopt(argv, "n:u:s:h")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == '-n':
+            n = int(arg)
+        elif opt == '-u':
+            updates = int(arg)
+        elif opt == '-s':
+            seed = int(arg)
+
+    wrong, checked, refused = check(n, updates, seed)
+    print('{} of {} updates differ from a fresh model, {} moves were refused'.format(wrong, checked, refused))
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,44 @@
+'''
+Runs one level's solution on one input and prints the time of every phase
+as JSON. Every case runs in its own process, since both levels have their
+own main and model modules.
+
+    python -m benchmarks.phases <level dir> <input file> <output file>
+'''
+
+# Generic/Built-in Libs
+import sys, os, json, time
+
+# Other imports
+from common.writer import TimedWriter
+
+
+def run(level_dir, inputfilepath, outputfilepath):
+    '''
+    Returns the seconds spent in the parse, compute and write phases of
+    the level's solution. Writing is timed inside the solution, compute is
+    the rest of the time the solution takes.
+    '''
+    sys.path.insert(0, os.path.abspath(level_dir))
+    import main as level_main
+
+    start = time.perf_counter()
+    icparsed = level_main.read_ints(inputfilepath)
+    parse = time.perf_counter() - start
+
+    start = time.perf_counter()
+    out = TimedWriter(level_main.RowWriter(outputfilepath))
+    level_main.solution(icparsed, out)
+    out.close()
+    solution = time.perf_counter() - start
+
+    return {
+        'parse': parse,
+        'compute': solution - out.seconds,
+        'write': out.seconds,
+        'total': parse + solution,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(*sys.argv[1:4])))
@@ -0,0 +1,124 @@
+'''
+Checks the distances the level 5 Router finds with A* and landmarks
+against the ones all_pairs finds, for every pair of capitals of random
+graphs and generated maps. Exits with status 1 if they disagree on any
+pair.
+
+    python -m benchmarks.routing -n <graphs> -s <seed>
+
+    Note:
+        - Random graphs have random directed edges between capitals spread
+        on a small grid or very far apart, and many pairs without a path.
+        - Every other graph is solved by all_pairs with Dijkstra instead of
+        the dense kernel. Every graph is routed with 0 to 3 landmarks.
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, os, tempfile
+import numpy as np
+
+# Other imports
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'level_5'))
+from model import Matrix, CountryGraph, Cell
+from routing import Router
+import paths
+from common.reader import read_ints
+from benchmarks.generate import level5_input
+
+# Width of the grid of the far apart capitals
+FAR = 900000
+
+
+def random_graph(rng, near):
+    '''Returns a random CountryGraph and its capitals.'''
+    n = int(rng.integers(1, 25))
+    m = int(rng.integers(0, n * 4))
+    pairs = np.unique(rng.integers(0, n, m) * n + rng.integers(0, n, m))
+    pairs = pairs[pairs // n != pairs % n]
+    width = 60 if near else FAR
+    cells = rng.choice(width * width, n, replace=False)
+    capitals = [Cell(x=int(c % width), y=int(c // width), altitude=None, country=i) for i, c in enumerate(cells)]
+    return CountryGraph.from_edges(n, pairs // n, pairs % n, capitals), capitals
+
+
+def generated_graph(path, rng, seed):
+    '''
+    Returns the CountryGraph and the capitals of a generated map, or None
+    if the map has a country without a capital.
+    '''
+    rows, cols = int(rng.integers(10, 60)), int(rng.integers(10, 60))
+    try:
+        level5_input(path, rows, cols, int(rng.integers(2, 30)), 1, seed=seed)
+    except ValueError:
+        return None
+    icparsed = read_ints(path)
+    k = int(icparsed[0])
+    cells = icparsed[k*2+3:k*2+3 + rows*cols*2].reshape(cols, rows, 2)
+    matrix = Matrix.from_planes(cells[:, :, 0], cells[:, :, 1])
+    capitals, _ = matrix.find_capitals()
+    if None in capitals:
+        return None
+    return matrix.find_neighbours(capitals), capitals
+
+
+def differences(graph, capitals, landmarks):
+    '''Returns the (source, target) pairs on which the Router is wrong.'''
+    distances = paths.all_pairs(graph)
+    router = Router(graph, capitals, landmarks)
+    n = len(graph)
+    return [(s, t) for s in range(n) for t in range(n) if router.distance(s, t) != distances[s, t]]
+
+
+def check(n, seed):
+    '''
+    Returns the number of graphs on which the Router differs from
+    all_pairs and the number of graphs checked.
+    '''
+    rng = np.random.default_rng(seed)
+    dense_max_nodes = paths.DENSE_MAX_NODES
+    wrong, checked = 0, 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(n):
+            paths.DENSE_MAX_NODES = dense_max_nodes if i % 2 == 0 else 0
+            if i % 4 == 3:
+                generated = generated_graph(os.path.join(tmp, 'map.in'), rng, seed * n + i)
+                if generated is None:
+                    continue
+            else:
+                generated = random_graph(rng, i % 4 != 2)
+            checked += 1
+            graph, capitals = generated
+            pairs = differences(graph, capitals, int(rng.integers(0, 4)))
+            if pairs:
+                wrong += 1
+                print('Mismatch: graph {} on {} pairs, first {}'.format(i, len(pairs), pairs[0]), file=sys.stderr)
+    paths.DENSE_MAX_NODES = dense_max_nodes
+    return wrong, checked
+
+
+def main(argv):
+    n, seed = 200, 0
+    usage = 'Usage: python -m benchmarks.routing -n <graphs> -s <seed> -h'
+    try:
+        opts, args = getopt.getopt(argv, "n:s:h")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == '-n':
+            n = int(arg)
+        elif opt == '-s':
+            seed = int(arg)
+
+    wrong, checked = check(n, seed)
+    print('{} of {} graphs differ from all_pairs'.format(wrong, checked))
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
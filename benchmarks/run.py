@@ -0,0 +1,144 @@
+'''
+Generates the inputs of a suite, runs every case a few times and records
+the median time of every phase as JSON.
+
+    python -m benchmarks.run -s <suite> -o <resultsfile> -r <repeats> -d <inputsdir>
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, os, json, time, platform, subprocess, tempfile
+from statistics import median
+
+# Other imports
+from benchmarks import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEVEL_DIRS = {4: os.path.join(ROOT, 'level_4'), 5: os.path.join(ROOT, 'level_5')}
+
+# suite name -> list of (level, generator parameters)
+SUITES = {
+    'small': [
+        (4, dict(rows=100, cols=100, rays=1000, directions='uniform')),
+        (4, dict(rows=100, cols=100, rays=1000, directions='repeated')),
+        (5, dict(rows=60, cols=60, countries=20, solars=50, shape='voronoi')),
+    ],
+    'default': [
+        (4, dict(rows=1000, cols=1000, rays=10000, directions='uniform')),
+        (4, dict(rows=1000, cols=1000, rays=10000, directions='axis')),
+        (4, dict(rows=1000, cols=1000, rays=10000, directions='diagonal')),
+        (4, dict(rows=1000, cols=1000, rays=10000, directions='repeated')),
+        (5, dict(rows=300, cols=300, countries=200, solars=1000, shape='voronoi')),
+        (5, dict(rows=300, cols=300, countries=200, solars=1000, shape='blocks')),
+    ],
+    'large': [
+        (4, dict(rows=10000, cols=10000, rays=100000, directions='uniform')),
+        (4, dict(rows=10000, cols=10000, rays=100000, directions='repeated')),
+        (5, dict(rows=2000, cols=2000, countries=2000, solars=10000, shape='voronoi')),
+    ],
+}
+
+
+def case_name(level, params):
+    return 'level{}_'.format(level) + '_'.join('{}-{}'.format(k, params[k]) for k in sorted(params))
+
+
+def generate_input(level, params, inputs_dir):
+    '''Returns the path of the case's input, generating it if needed.'''
+    path = os.path.join(inputs_dir, case_name(level, params) + '.in')
+    if not os.path.exists(path):
+        if level == 4:
+            generate.level4_input(path + '.tmp', **params)
+        else:
+            generate.level5_input(path + '.tmp', **params)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def run_case(level, inputfilepath, repeats):
+    '''Runs the case in a fresh process every time, returns the runs.'''
+    runs = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        outputfilepath = os.path.join(out_dir, 'out')
+        for _ in range(repeats):
+            result = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.phases', LEVEL_DIRS[level], inputfilepath, outputfilepath],
+                cwd=ROOT, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+            runs.append(json.loads(result.stdout))
+    return runs
+
+
+def run_suite(suite, repeats, inputs_dir):
+    if not os.path.exists(inputs_dir):
+        os.makedirs(inputs_dir)
+
+    cases = {}
+    for level, params in SUITES[suite]:
+        name = case_name(level, params)
+        print('Running ' + name, file=sys.stderr)
+        runs = run_case(level, generate_input(level, params, inputs_dir), repeats)
+        cases[name] = {
+            'level': level,
+            'params': params,
+            'runs': runs,
+            'median': {phase: median(run[phase] for run in runs) for phase in runs[0]},
+        }
+    return {'meta': _meta(suite, repeats), 'cases': cases}
+
+
+def _meta(suite, repeats):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        commit = None
+    import numpy
+    return {
+        'suite': suite,
+        'repeats': repeats,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main(argv):
+    suite, resultsfilepath, repeats = 'default', None, 3
+    inputs_dir = os.path.join(tempfile.gettempdir(), 'ccc2019_bench')
+    usage = 'Usage: python -m benchmarks.run -s <suite> -o <resultsfile> -r <repeats> -d <inputsdir> -h'
+    try:
+        opts, args = getopt.getopt(argv, "s:o:r:d:h")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            print('Suites: ' + ', '.join(SUITES))
+            sys.exit()
+        elif opt == '-s':
+            suite = arg
+        elif opt == '-o':
+            resultsfilepath = arg
+        elif opt == '-r':
+            repeats = int(arg)
+        elif opt == '-d':
+            inputs_dir = arg
+    if suite not in SUITES:
+        print('ERROR. Unknown suite: ' + suite)
+        print(usage)
+        sys.exit(2)
+
+    results = run_suite(suite, repeats, inputs_dir)
+    content = json.dumps(results, indent=2)
+    if resultsfilepath:
+        with open(resultsfilepath, 'w') as f:
+            f.write(content)
+    else:
+        print(content)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
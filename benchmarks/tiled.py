@@ -0,0 +1,133 @@
+'''
+Checks the capitals and the country graph the level 5 TiledMap finds band
+by band against the ones Matrix finds for the whole map in memory, on
+random maps and small band sizes. Exits with status 1 if they disagree on
+any map.
+
+    python -m benchmarks.tiled -n <maps> -s <seed> -g <gridsize>
+
+    Note:
+        - Half of the maps are generated inputs converted with
+        convert_map, the other half random planes of a few countries with
+        ragged borders. Maps with a country without a capital have no
+        graph and are skipped.
+        - Every map is read with bands of 1, 2, 3 and 5 lines and with the
+        default band, so countries and borders cross many bands.
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, os, tempfile
+import numpy as np
+
+# Other imports
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'level_5'))
+from model import Matrix
+from tiled import TiledMap, convert_map
+from common.reader import read_ints
+from benchmarks.generate import level5_input
+
+BAND_LINES = (1, 2, 3, 5, None)
+
+
+def generated_map(input_f, map_f, rng, seed, size):
+    '''
+    Writes a generated input and its .npy map, returns the planes of the
+    map or None if the generator refused the size.
+    '''
+    rows, cols = int(rng.integers(6, size + 6)), int(rng.integers(6, size + 6))
+    shape = 'voronoi' if rng.random() < 0.5 else 'blocks'
+    try:
+        level5_input(input_f, rows, cols, int(rng.integers(1, 12)), 3, shape=shape, seed=seed)
+    except ValueError:
+        return None
+    convert_map(input_f, map_f)
+    icparsed = read_ints(input_f)
+    k = int(icparsed[0])
+    cells = icparsed[k*2+3:k*2+3 + rows*cols*2].reshape(cols, rows, 2)
+    return cells[:, :, 0], cells[:, :, 1]
+
+
+def random_map(map_f, rng, size):
+    '''Writes a random .npy map and returns its planes.'''
+    rows, cols = int(rng.integers(1, size + 1)), int(rng.integers(1, size + 1))
+    country = rng.integers(0, int(rng.integers(1, 5)), (cols, rows))
+    # neighbours copied over each other make ragged borders
+    for _ in range(int(rng.integers(0, 3))):
+        shifted = np.roll(country, 1, int(rng.integers(0, 2)))
+        country = np.where(rng.random(country.shape) < 0.6, shifted, country)
+    # country ids are 0..n-1
+    country = np.unique(country, return_inverse=True)[1].reshape(cols, rows)
+    altitude = rng.integers(0, 9, (cols, rows))
+    np.save(map_f, np.stack((altitude, country), 2).astype(np.int32))
+    return altitude, country
+
+
+def differences(matrix, capitals, tiled):
+    '''Returns what of the tiled map's results differ from the matrix's.'''
+    tiled_capitals, tiled_graph = tiled.find_capitals_and_neighbours()
+    if tiled_capitals != capitals:
+        return ['capitals']
+    graph = matrix.find_neighbours(capitals)
+    return [name for name in ('offsets', 'targets', 'weights')
+            if not np.array_equal(getattr(graph, name), getattr(tiled_graph, name))]
+
+
+def check(n, seed, size):
+    '''
+    Returns the number of maps on which TiledMap differs from Matrix and
+    the number of maps checked.
+    '''
+    rng = np.random.default_rng(seed)
+    wrong, checked = 0, 0
+    with tempfile.TemporaryDirectory() as tmp:
+        input_f, map_f = os.path.join(tmp, 'map.in'), os.path.join(tmp, 'map.npy')
+        for i in range(n):
+            if i % 2 == 0:
+                planes = generated_map(input_f, map_f, rng, seed * n + i, size)
+                if planes is None:
+                    continue
+            else:
+                planes = random_map(map_f, rng, size)
+            matrix = Matrix.from_planes(*planes)
+            capitals, _ = matrix.find_capitals()
+            if None in capitals:
+                continue
+            checked += 1
+            for band_lines in BAND_LINES:
+                parts = differences(matrix, capitals, TiledMap(map_f, band_lines))
+                if parts:
+                    wrong += 1
+                    print('Mismatch: map {} with bands of {} lines: {}'.format(i, band_lines, ', '.join(parts)),
+                          file=sys.stderr)
+                    break
+    return wrong, checked
+
+
+def main(argv):
+    n, seed, size = 400, 0, 12
+    usage = 'Usage: python -m benchmarks.tiled -n <maps> -s <seed> -g <gridsize> -h'
+    try:
+        opts, args = getopt.getopt(argv, "n:s:g:h")
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == '-n':
+            n = int(arg)
+        elif opt == '-s':
+            seed = int(arg)
+        elif opt == '-g':
+            size = int(arg)
+
+    wrong, checked = check(n, seed, size)
+    print('{} of {} maps differ from the in-memory Matrix'.format(wrong, checked))
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1 @@
+'''Code shared by the solutions of several levels.'''
@@ -0,0 +1,85 @@
+'''
+    Note:
+        - Profiling is off unless enable() is called. While it is off
+        phase() does nothing but a flag check and count() returns right
+        away, hot loops should still add up their events locally and call
+        count() once.
+'''
+
+# Generic/Built-in Libs
+import sys, json
+from time import perf_counter
+
+ENABLED = False
+
+# phase name -> seconds, counter name -> count
+TIMINGS = {}
+COUNTERS = {}
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+    TIMINGS.clear()
+    COUNTERS.clear()
+
+
+def count(name, n=1):
+    if ENABLED:
+        COUNTERS[name] = COUNTERS.get(name, 0) + n
+
+
+class phase:
+    '''
+    Context manager adding the time spent in its block to the phase. A
+    phase can be entered many times, the times are summed up.
+    '''
+    __slots__ = ['name', 'start']
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if ENABLED:
+            self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            TIMINGS[self.name] = TIMINGS.get(self.name, 0.0) + perf_counter() - self.start
+
+
+def timed_iter(iterable, name):
+    '''
+    Adds the time spent producing every item of the iterable to the phase.
+    Returns the iterable itself when profiling is off.
+    '''
+    if not ENABLED:
+        return iterable
+    return _timed_iter(iterable, name)
+
+
+def _timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def report(**meta):
+    '''Returns the report as a dictionary, with meta as extra fields.'''
+    result = dict(meta)
+    result['phases'] = dict(TIMINGS)
+    result['counters'] = dict(COUNTERS)
+    return result
+
+
+def dump(f=None, **meta):
+    '''Writes the report as JSON to the file (stderr by default).'''
+    f = f or sys.stderr
+    json.dump(report(**meta), f, indent=2)
+    f.write('\n')
@@ -0,0 +1,81 @@
+'''
+    Note:
+        - Input files are whitespace separated integers. They are decoded
+        straight from the raw bytes into NumPy arrays by NumPy's C parser,
+        without building intermediate Python strings or lists.
+'''
+
+# Generic/Built-in Libs
+import os
+import mmap
+import warnings
+import numpy as np
+
+# Size of the block of the file decoded at once
+CHUNK_SIZE = 1 << 23
+
+_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+def read_ints(filename, chunk_size=CHUNK_SIZE):
+    '''
+    Returns all the integers in the file as a 1-D int64 array. The file is
+    memory-mapped and decoded one block at a time into an array sized for
+    the most integers the file can hold, which is then shrunk in place,
+    so apart from the result only one block is held in memory.
+    '''
+    # every integer takes at least a digit and a whitespace, the pages of
+    # the array past the last integer are never touched
+    result = np.empty((os.path.getsize(filename) + 1) // 2, dtype=np.int64)
+    n = 0
+    for ints in iter_ints(filename, chunk_size):
+        result[n:n + len(ints)] = ints
+        n += len(ints)
+    result.resize(n, refcheck=False)
+    return result
+
+
+def iter_ints(filename, chunk_size=CHUNK_SIZE):
+    '''
+    Yields the integers in the file one block at a time, as 1-D int64
+    arrays, so a file larger than the memory can be streamed.
+    '''
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                # end the block at a whitespace so that no integer is cut
+                if end < size:
+                    cut = max(mm.rfind(b' ', start, end), mm.rfind(b'\n', start, end))
+                    end = cut + 1 if cut >= start else _next_whitespace(mm, end, size)
+                yield parse_ints(mm[start:end])
+                start = end
+
+
+def parse_ints(data):
+    '''
+    Returns the whitespace separated integers in data (str or bytes) as a
+    1-D int64 array. Raises ValueError if data holds anything else.
+    '''
+    if isinstance(data, str):
+        data = data.encode()
+    data = data.strip(_WHITESPACE)
+    # NumPy reads a block of whitespace only as a single 0
+    if not data:
+        return np.zeros(0, dtype=np.int64)
+    # NumPy only warns when it stops at a token that is not an integer,
+    # and raises ValueError when that warning is an error
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        return np.fromstring(data, dtype=np.int64, sep=' ')
+
+
+def _next_whitespace(mm, pos, size):
+    while pos < size and mm[pos:pos + 1] not in _WHITESPACE:
+        pos += 1
+    return pos
@@ -0,0 +1,145 @@
+'''
+    Note:
+        - Output files have one row of space separated integers per line,
+        every integer followed by a space, and no newline after the last
+        row.
+        - Blocks of rows are formatted by format_rows straight from the
+        NumPy arrays into bytes, without a Python string per integer.
+'''
+
+# Generic/Built-in Libs
+import sys, time
+from functools import lru_cache
+import numpy as np
+
+# Size of the buffer between the writer and the file
+BUFFER_SIZE = 1 << 20
+
+# Powers of ten up to the largest int64 one
+_POWERS = 10 ** np.arange(1, 19, dtype=np.int64)
+
+# The three ASCII digits of every number from 000 to 999
+_DIGITS = np.array([list(b'%03d' % i) for i in range(1000)], dtype=np.uint8)
+
+
+class RowWriter:
+    '''
+    Writes rows of integers to a file (or stdout when the filename is None
+    or '-') as they are produced. Nothing but the file buffer is kept in
+    memory.
+    '''
+
+    def __init__(self, filename=None):
+        if filename is None or filename == '-':
+            sys.stdout.flush()
+            self.f = sys.stdout.buffer
+            self.owns_f = False
+        else:
+            self.f = open(filename, 'wb', buffering=BUFFER_SIZE)
+            self.owns_f = True
+        self.rows = 0
+
+    def write_row(self, values):
+        line = ' '.join(map(str, values))
+        self._write_line((line + ' ' if line else '').encode())
+
+    def write_rows(self, matrix):
+        '''Writes every row of a 2-D array.'''
+        matrix = np.asarray(matrix)
+        offsets = np.arange(len(matrix) + 1) * matrix.shape[1]
+        self.write_formatted(format_rows(offsets, matrix.ravel()), len(matrix))
+
+    def write_ragged(self, offsets, values):
+        '''
+        Writes rows of different lengths given as one flat array, the i-th
+        row is values[offsets[i]:offsets[i+1]].
+        '''
+        self.write_formatted(format_rows(offsets, values), len(offsets) - 1)
+
+    def write_formatted(self, data, rows):
+        '''Writes the bytes format_rows returned for the given number of rows.'''
+        if rows > 0:
+            self.f.write(data if self.rows == 0 else b'\n' + data)
+            self.rows += rows
+
+    def _write_line(self, line):
+        self.f.write(line if self.rows == 0 else b'\n' + line)
+        self.rows += 1
+
+    def close(self):
+        if self.owns_f:
+            self.f.close()
+        else:
+            self.f.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TimedWriter:
+    '''Wraps a RowWriter and adds up the time spent writing.'''
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.seconds = 0.0
+
+    def __getattr__(self, name):
+        method = getattr(self.writer, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+        return timed
+
+
+def format_rows(offsets, values):
+    '''
+    Returns the rows values[offsets[i]:offsets[i+1]] as bytes in the output
+    format, every integer followed by a space and the rows separated by
+    newlines. All the integers are written at once into a fixed width
+    byte matrix, three digits at a time from a lookup table, and the
+    leading zeros are then dropped.
+    '''
+    values = np.asarray(values, dtype=np.int64).ravel()
+    offsets = np.asarray(offsets, dtype=np.int64)
+    rows = len(offsets) - 1
+    if rows <= 0:
+        return b''
+
+    negative = values < 0
+    magnitude = np.abs(values)
+    digits = np.searchsorted(_POWERS, magnitude, side='right') + 1
+    width = -(-int(digits.max()) // 3) * 3 if len(values) else 3
+
+    # sign, digits, space
+    text = np.empty((len(values), width + 2), dtype=np.uint8)
+    text[:, 0] = ord('-')
+    text[:, -1] = ord(' ')
+    for column in range(width - 2, 0, -3):
+        text[:, column:column + 3] = _DIGITS[magnitude % 1000]
+        magnitude //= 1000
+    keep = _keep_mask(width)[digits]
+    keep[:, 0] = negative
+
+    # every row but the last ends with a newline
+    ends = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(digits + negative + 1, out=ends[1:])
+    return np.insert(text[keep], ends[offsets[1:-1]], ord('\n')).tobytes()
+
+
+@lru_cache(maxsize=None)
+def _keep_mask(width):
+    '''
+    Row d tells which bytes of a formatted integer with d digits are kept:
+    the last d digits and the space.
+    '''
+    mask = np.zeros((width + 1, width + 2), dtype=bool)
+    for d in range(1, width + 1):
+        mask[d, width + 1 - d:] = True
+    return mask
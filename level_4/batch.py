@@ -0,0 +1,258 @@
+# Generic/Built-in Libs
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+
+# Other imports
+from common import profile
+from common.writer import format_rows
+
+# Upper bound on the number of candidate cells tested at once
+CHUNK_CANDIDATES = 1 << 22
+
+
+def parse_rays(icparsed, n):
+    '''
+    Returns the origins and directions of the n rays in the parsed input
+    as two (n, 2) integer arrays.
+    '''
+    data = np.asarray(icparsed[3:3 + n*4], dtype=np.int64).reshape(n, 4)
+    return data[:, 0:2], data[:, 2:4]
+
+
+def trace_rays(origins, directions, rows, cols):
+    '''
+    Finds the visited cells of every ray at once. Gives the same cells, in
+    the same order, as calling Ray.get_cells(rows, cols) for every ray.
+
+    params:
+        origins: (n, 2) integer array of the rays' origins
+        directions: (n, 2) integer array of the rays' directions
+    returns:
+        offsets: (n + 1) array, cells of the i-th ray are
+            xs[offsets[i]:offsets[i+1]], ys[offsets[i]:offsets[i+1]]
+        xs, ys: flat arrays of the visited cells' indexes
+    '''
+    offsets_parts, xs_parts, ys_parts = [np.zeros(1, dtype=np.int64)], [], []
+    total = 0
+    for _, offsets, xs, ys in iter_trace_rays(origins, directions, rows, cols):
+        offsets_parts.append(offsets[1:] + total)
+        xs_parts.append(xs)
+        ys_parts.append(ys)
+        total += offsets[-1]
+
+    if not xs_parts:
+        return offsets_parts[0], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(offsets_parts), np.concatenate(xs_parts), np.concatenate(ys_parts)
+
+
+def iter_trace_rays(origins, directions, rows, cols):
+    '''
+    Same as trace_rays, but yields the result one chunk of rays at a time
+    as (first ray index, offsets, xs, ys), so only one chunk is held in
+    memory. Offsets are relative to the chunk.
+    '''
+    origins = np.asarray(origins, dtype=np.int64).reshape(-1, 2)
+    directions = np.asarray(directions, dtype=np.int64).reshape(-1, 2)
+
+    counts = _candidate_counts(origins, directions, rows, cols)
+    profile.count('candidate_cells', int(counts.sum()))
+
+    # split the rays into chunks so that the candidate arrays stay bounded
+    for start, end in _chunks(counts, CHUNK_CANDIDATES):
+        offsets, xs, ys = _trace_rays_chunk(origins[start:end], directions[start:end], rows, cols)
+        yield start, offsets, xs, ys
+
+
+def iter_trace_rays_parallel(origins, directions, rows, cols, workers, chunk_candidates=None):
+    '''
+    Same as iter_trace_rays, but the chunks of rays are traced by a pool
+    of worker processes. Chunks are yielded in input order. At most two
+    chunks per worker are traced ahead of the one being yielded, so
+    memory stays bounded when the consumer is slower than the pool.
+
+    params:
+        workers: number of worker processes
+        chunk_candidates: number of candidate cells sent to a worker at
+            once, by default the candidates are split into about 8 chunks
+            per worker, and never more than CHUNK_CANDIDATES
+    '''
+    return _iter_pool(_trace_task, origins, directions, rows, cols, workers, chunk_candidates)
+
+
+def iter_format_rays_parallel(origins, directions, rows, cols, workers, chunk_candidates=None):
+    '''
+    Same as iter_trace_rays_parallel, but the workers also format their
+    chunk, so the parent only writes the bytes. Yields (first ray index,
+    number of rays, number of visited cells, bytes) in input order, the
+    bytes are what RowWriter.write_formatted takes, one x0 y0 x1 y1 ...
+    row per ray.
+    '''
+    return _iter_pool(_format_task, origins, directions, rows, cols, workers, chunk_candidates)
+
+
+def hit_density(chunks, rows, cols):
+    '''
+    Counts how many rays visit every cell. Takes the chunks yielded by
+    iter_trace_rays (or any of its variants) and adds them to a rows x
+    cols grid one by one, so memory depends only on the grid and chunk
+    size, never on the total number of visited cells.
+
+    returns:
+        (rows, cols) array, density[x, y] is the number of rays that
+        visit the cell (x, y)
+    '''
+    density = np.zeros(rows * cols, dtype=np.int64)
+    for _, _, xs, ys in chunks:
+        np.add.at(density, xs * cols + ys, 1)
+    return density.reshape(rows, cols)
+
+
+def _chunks(counts, limit):
+    '''
+    Splits the rays into (start, end) ranges of at most limit candidate
+    cells, a ray with more candidates than that gets a range of its own.
+    '''
+    n = len(counts)
+    start = 0
+    while start < n:
+        end = start + 1
+        total = counts[start]
+        while end < n and total + counts[end] <= limit:
+            total += counts[end]
+            end += 1
+        yield start, end
+        start = end
+
+
+def _trace_rays_chunk(origins, directions, rows, cols):
+    ray_ids, xs, ys = _trace_chunk(origins, directions, rows, cols)
+    offsets = np.zeros(len(origins) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ray_ids, minlength=len(origins)), out=offsets[1:])
+    return offsets, xs, ys
+
+
+def _iter_pool(task_fun, origins, directions, rows, cols, workers, chunk_candidates):
+    origins = np.asarray(origins, dtype=np.int64).reshape(-1, 2)
+    directions = np.asarray(directions, dtype=np.int64).reshape(-1, 2)
+    # the workers' counters are lost, the candidates are counted here
+    counts = _candidate_counts(origins, directions, rows, cols)
+    profile.count('candidate_cells', int(counts.sum()))
+    if chunk_candidates is None:
+        chunk_candidates = min(CHUNK_CANDIDATES, max(1, -(-int(counts.sum()) // (workers * 8))))
+
+    pending = deque()
+    with Pool(workers) as pool:
+        for start, end in _chunks(counts, chunk_candidates):
+            task = (start, origins[start:end], directions[start:end], rows, cols)
+            pending.append(pool.apply_async(task_fun, (task,)))
+            if len(pending) > workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def _trace_task(task):
+    start, origins, directions, rows, cols = task
+    offsets, xs, ys = _trace_rays_chunk(origins, directions, rows, cols)
+    return start, offsets, xs, ys
+
+
+def _format_task(task):
+    start, origins, directions, rows, cols = task
+    offsets, xs, ys = _trace_rays_chunk(origins, directions, rows, cols)
+    data = format_rows(offsets * 2, np.column_stack((xs, ys)).ravel())
+    return start, len(origins), len(xs), data
+
+
+def _layout(origins, directions, rows, cols):
+    '''
+    Splits every ray into its outer (non-dominant) and inner axis, the
+    same way Ray._iter_indexes does. Returns per-ray arrays of the origin,
+    direction, step and the number of cells left in the quadrant for both
+    axes, plus the number of outer lines and the band width per line.
+    Rays with no outer movement start their band at the origin.
+    '''
+    ox, oy = origins[:, 0], origins[:, 1]
+    dx, dy = directions[:, 0], directions[:, 1]
+
+    step_x = np.where(dx < 0, -1, 1)
+    step_y = np.where(dy >= 0, 1, -1)
+    len_x = np.where(step_x > 0, rows - ox, ox + 1)
+    len_y = np.where(step_y > 0, cols - oy, oy + 1)
+
+    dom_x = np.abs(dx) >= np.abs(dy)
+    o_out, o_in = np.where(dom_x, oy, ox), np.where(dom_x, ox, oy)
+    d_out = np.abs(np.where(dom_x, dy, dx))
+    d_in = np.abs(np.where(dom_x, dx, dy))
+    step_out, step_in = np.where(dom_x, step_y, step_x), np.where(dom_x, step_x, step_y)
+    len_out, len_in = np.where(dom_x, len_y, len_x), np.where(dom_x, len_x, len_y)
+
+    # the ray advances d_in / d_out inner cells per outer line
+    safe_out, safe_in = np.maximum(d_out, 1), np.maximum(d_in, 1)
+    lines = np.where(
+        d_in > 0,
+        np.minimum(len_out, (len_in + 2) * d_out // safe_in + 2),
+        len_out)
+    width = d_in // safe_out + 5
+
+    # case when the ray is parallel to the inner axis: one full line
+    parallel = (d_out == 0) & (d_in != 0)
+    lines = np.where(parallel, 1, lines)
+    width = np.where(parallel, len_in, width)
+    # case when direction of the ray is (0, 0): a single inner cell per line
+    width = np.where((d_out == 0) & (d_in == 0), 1, width)
+
+    return dom_x, o_out, o_in, step_out, step_in, len_in, d_out, d_in, lines, width
+
+
+def _candidate_counts(origins, directions, rows, cols):
+    layout = _layout(origins, directions, rows, cols)
+    lines, width = layout[-2], layout[-1]
+    return np.maximum(lines, 0) * np.maximum(width, 0)
+
+
+def _trace_chunk(origins, directions, rows, cols):
+    '''
+    Lists the candidate cells of every ray in the chunk (the band around
+    the ray on every outer line, in traversal order) and keeps the ones
+    the ray's line crosses. Returns the ray id and indexes of every
+    visited cell.
+    '''
+    dom_x, o_out, o_in, step_out, step_in, len_in, d_out, d_in, lines, width = \
+        _layout(origins, directions, rows, cols)
+    counts = np.maximum(lines, 0) * np.maximum(width, 0)
+
+    ray_ids = np.repeat(np.arange(len(origins)), counts)
+    q = np.arange(len(ray_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+    w = width[ray_ids]
+    t, k = q // w, q % w
+
+    # first candidate on every line, relative to the origin
+    d_out, d_in = d_out[ray_ids], d_in[ray_ids]
+    band_start = (2*t - 1) * d_in // (2 * np.maximum(d_out, 1)) - 1
+    rel = np.where(d_out == 0, 0, band_start) + k
+    valid = (rel >= 0) & (rel < len_in[ray_ids])
+
+    ray_ids, t, rel = ray_ids[valid], t[valid], rel[valid]
+    outer = o_out[ray_ids] + step_out[ray_ids] * t
+    inner = o_in[ray_ids] + step_in[ray_ids] * rel
+    dom = dom_x[ray_ids]
+    xs, ys = np.where(dom, inner, outer), np.where(dom, outer, inner)
+
+    visited = _visited(xs, ys, origins[ray_ids], directions[ray_ids])
+    return ray_ids[visited], xs[visited], ys[visited]
+
+
+def _visited(xs, ys, origins, directions):
+    '''
+    Vectorized Ray._visited: is the cell's square crossed by the line the
+    ray lies on. Exact integer arithmetic.
+    '''
+    ox, oy = origins[:, 0], origins[:, 1]
+    dx, dy = directions[:, 0], directions[:, 1]
+
+    # a ray with direction (0, 0) visits the same cells as one with (0, 1)
+    dy = np.where((dx == 0) & (dy == 0), 1, dy)
+    base = 2 * (dx * (ys - oy) - dy * (xs - ox))
+    return np.abs(base) <= np.abs(dx) + np.abs(dy)
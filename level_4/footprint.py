@@ -0,0 +1,205 @@
+'''
+    Note:
+        - Every origin is the centre of a cell, so the cells a ray visits
+        relative to its origin depend only on its direction. Directions
+        are reduced by their gcd, (62, 77) and (124, 154) lie on the same
+        line and share a footprint.
+'''
+
+# Generic/Built-in Libs
+from collections import OrderedDict
+from math import gcd
+import numpy as np
+
+# Other imports
+from model import Point
+from batch import trace_rays
+
+# Default memory budget of the stored footprints, in bytes
+MEMORY_BUDGET = 64 << 20
+
+# Number of directions seen once that are remembered
+SEEN_DIRECTIONS = 1 << 16
+
+
+class FootprintCache:
+    '''
+    LRU cache of ray footprints (visited cells relative to the origin, in
+    traversal order) keyed by the reduced direction. A footprint is
+    traced once for the largest grid asked for so far and clipped to the
+    grid for every ray that uses it. A footprint costs more to trace than
+    a ray, so a direction gets one only once it is seen the second time.
+    A miss is a ray or a footprint traced, a hit a ray that reuses one.
+    '''
+
+    def __init__(self, memory_budget=MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self.footprints = OrderedDict()
+        # directions seen once, oldest first
+        self.seen = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_cells(self, ray, rows, cols):
+        '''Same result as ray.get_cells(rows, cols).'''
+        xs, ys = self.cells(ray.o, ray.d, rows, cols)
+        return [Point(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+
+    def cells(self, origin, direction, rows, cols):
+        '''Returns the xs and ys arrays of the cells the ray visits.'''
+        # traced for the whole grid, so that every origin can reuse it
+        rel_x, rel_y = self._footprint(_reduce(int(direction[0]), int(direction[1])), rows, cols)
+        return _clip(origin, direction, rel_x, rel_y, rows, cols)
+
+    def iter_trace_rays(self, origins, directions, rows, cols, chunk_rays=4096):
+        '''
+        Same output as batch.iter_trace_rays, with the footprints taken
+        from the cache. The footprints a chunk misses, and the rays whose
+        direction is new, are traced together in one call each.
+        '''
+        origins = np.asarray(origins, dtype=np.int64).reshape(-1, 2)
+        directions = np.asarray(directions, dtype=np.int64).reshape(-1, 2)
+        for start in range(0, len(origins), chunk_rays):
+            chunk_origins, chunk_directions = origins[start:start + chunk_rays], directions[start:start + chunk_rays]
+            keys = [_reduce(dx, dy) for dx, dy in chunk_directions.tolist()]
+            repeated = self._admit(keys)
+            # kept for the chunk even if they are evicted meanwhile
+            footprints, traced = self._footprints(repeated, rows, cols)
+
+            # rays of directions seen for the first time are traced as they are
+            new = [i for i, key in enumerate(keys) if key not in repeated]
+            offsets, xs, ys = trace_rays(chunk_origins[new], chunk_directions[new], rows, cols)
+            rays = dict(zip(new, range(len(new))))
+            self.misses += len(new)
+            self.hits += len(keys) - len(new) - traced
+
+            xs_parts, ys_parts = [], []
+            for i, (origin, direction, key) in enumerate(zip(chunk_origins, chunk_directions, keys)):
+                if i in rays:
+                    j = rays[i]
+                    xs_parts.append(xs[offsets[j]:offsets[j+1]])
+                    ys_parts.append(ys[offsets[j]:offsets[j+1]])
+                    continue
+                ray_xs, ray_ys = _clip(origin, direction, *footprints[key], rows, cols)
+                xs_parts.append(ray_xs)
+                ys_parts.append(ray_ys)
+            offsets = np.zeros(len(xs_parts) + 1, dtype=np.int64)
+            np.cumsum([len(xs) for xs in xs_parts], out=offsets[1:])
+            yield start, offsets, np.concatenate(xs_parts), np.concatenate(ys_parts)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'footprints': len(self.footprints),
+            'bytes': self.nbytes,
+        }
+
+    def _admit(self, keys):
+        '''
+        Returns the set of the directions that have a footprint or get one:
+        the ones cached, seen before or used by more than one of the keys.
+        The others are remembered as seen.
+        '''
+        counts = {}
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+        admitted = set()
+        for key, count in counts.items():
+            if key in self.footprints or count > 1 or self.seen.pop(key, None) is not None:
+                admitted.add(key)
+            else:
+                self.seen[key] = True
+                if len(self.seen) > SEEN_DIRECTIONS:
+                    self.seen.popitem(last=False)
+        return admitted
+
+    def _footprints(self, directions, len_x, len_y):
+        '''
+        Returns a dictionary (direction -> footprint) of the directions,
+        the missing ones are traced with one trace_rays call, and the
+        number of footprints traced.
+        '''
+        found, missing = {}, []
+        for direction in directions:
+            entry = self.footprints.get(direction)
+            if entry is not None and entry[0] >= len_x and entry[1] >= len_y:
+                self.footprints.move_to_end(direction)
+                found[direction] = entry[2], entry[3]
+            else:
+                missing.append(direction)
+
+        self.misses += len(missing)
+        for direction, footprint in zip(missing, _trace_footprints(missing, len_x, len_y)):
+            self._store(direction, len_x, len_y, *footprint)
+            found[direction] = footprint
+        return found, len(missing)
+
+    def _footprint(self, direction, len_x, len_y):
+        entry = self.footprints.get(direction)
+        if entry is not None and entry[0] >= len_x and entry[1] >= len_y:
+            self.hits += 1
+            self.footprints.move_to_end(direction)
+            return entry[2], entry[3]
+
+        self.misses += 1
+        if entry is not None:
+            len_x, len_y = max(len_x, entry[0]), max(len_y, entry[1])
+        rel_x, rel_y = _trace_footprints([direction], len_x, len_y)[0]
+        self._store(direction, len_x, len_y, rel_x, rel_y)
+        return rel_x, rel_y
+
+    def _store(self, direction, len_x, len_y, rel_x, rel_y):
+        if direction in self.footprints:
+            self._remove(direction)
+        self.footprints[direction] = (len_x, len_y, rel_x, rel_y)
+        self.nbytes += rel_x.nbytes + rel_y.nbytes
+        # evict the least recently used footprints, always keep the new one
+        while self.nbytes > self.memory_budget and len(self.footprints) > 1:
+            self._remove(next(iter(self.footprints)))
+            self.evictions += 1
+
+    def _remove(self, direction):
+        _, _, rel_x, rel_y = self.footprints.pop(direction)
+        self.nbytes -= rel_x.nbytes + rel_y.nbytes
+
+
+def _clip(origin, direction, rel_x, rel_y, rows, cols):
+    '''Moves the footprint to the origin and clips it to the grid.'''
+    ox, oy = int(origin[0]), int(origin[1])
+    dx, dy = int(direction[0]), int(direction[1])
+    len_x = rows - ox if dx >= 0 else ox + 1
+    len_y = cols - oy if dy >= 0 else oy + 1
+
+    # the footprint is monotone along the outer (non-dominant) axis,
+    # along the inner one a corner touch can step back by one cell
+    dom_x = abs(dx) >= abs(dy)
+    rel_out, len_out = (rel_y, len_y) if dom_x else (rel_x, len_x)
+    end = np.searchsorted(np.abs(rel_out), len_out)
+    rel_x, rel_y = rel_x[:end], rel_y[:end]
+    inside = (np.abs(rel_x) < len_x) & (np.abs(rel_y) < len_y)
+    return ox + rel_x[inside], oy + rel_y[inside]
+
+
+def _reduce(dx, dy):
+    g = gcd(dx, dy)
+    return (dx // g, dy // g) if g else (0, 0)
+
+
+def _trace_footprints(directions, len_x, len_y):
+    '''
+    Traces a ray with every given direction from the corner of a len_x by
+    len_y grid, so that its whole quadrant fits, all in one trace_rays
+    call. Returns the visited cells of every ray relative to its origin.
+    '''
+    if not directions:
+        return []
+    directions = np.array(directions, dtype=np.int64).reshape(-1, 2)
+    origins = np.stack((np.where(directions[:, 0] >= 0, 0, len_x - 1),
+                        np.where(directions[:, 1] >= 0, 0, len_y - 1)), axis=1)
+    offsets, xs, ys = trace_rays(origins, directions, len_x, len_y)
+    return [(xs[offsets[i]:offsets[i+1]] - ox, ys[offsets[i]:offsets[i+1]] - oy)
+            for i, (ox, oy) in enumerate(origins.tolist())]
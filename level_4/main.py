@@ -1,127 +1,163 @@
 # Generic/Built-in Libs
 import sys, getopt, os
 from collections import namedtuple
-import matplotlib.pyplot as plt
 import numpy as np
 
 # Other imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.reader import read_ints
+from common.writer import RowWriter
+from common import profile
 from model import *
-
-# Globals
-ROWS, COLS, N = 0, 0, 0
-INPUT_F = None
+from batch import parse_rays, iter_trace_rays, iter_trace_rays_parallel, iter_format_rays_parallel, hit_density
+from footprint import FootprintCache
+from visualize import RayRenderer
 
 def _get_inputfilepath(argv):
     """Parses the command-line arguments. Returns the output file path."""
-    global INPUT_F
-
     inputfilepath = None
     outputfilepath = None
+    workers = 1
+    visualize = False
+    cache_mb = None
+    density = False
+    profiling = False
     try:
-        opts, args = getopt.getopt(argv,"i:o:h")
+        opts, args = getopt.getopt(argv,"i:o:hv",["workers=", "cache=", "density", "profile"])
     except getopt.GetoptError:
-        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> -h')
+        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> --workers <n> --cache <mb> --density --profile -v -h')
         sys.exit(2)
     found = False
     for opt, arg in opts:
         if opt == '-h':
-            print('Usage: example.py -i <inputfilepath> -o <outputfilepath>')
+            print('Usage: example.py -i <inputfilepath> -o <outputfilepath> --workers <n> --cache <mb> --density --profile -v')
             sys.exit()
         elif opt == '-i':
             inputfilepath = arg
-            INPUT_F = inputfilepath
             found = True
         elif opt == '-o':
             outputfilepath = arg
+        elif opt == '--workers':
+            workers = int(arg)
+        elif opt == '--cache':
+            cache_mb = int(arg)
+        elif opt == '--density':
+            density = True
+        elif opt == '--profile':
+            profiling = True
+        elif opt == '-v':
+            visualize = True
     if not found:
         print('ERROR.')
-        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> -h')
+        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> --workers <n> --cache <mb> --density --profile -v -h')
         sys.exit()
+    if cache_mb != None and workers > 1:
+        print('ERROR. --cache can not be used with --workers.')
+        sys.exit(2)
 
-    return inputfilepath, outputfilepath
-
-
-def read_file(filename):
-    f = open(filename, 'r')
-    return f.read()
-
-
-def write_to_file(filename, content):
-    f = open(filename, 'w')
-    f.write(content)
-
-
-def _parse_rays(icparsed):
-    global N
-
-    rays = []
-    for i in range(3, N*4, 4):
-        r = Ray(icparsed[i], icparsed[i+1], icparsed[i+2], icparsed[i+3])
-        rays.append(r)
-
-    return rays
-    
-
-def _visualize(i, r, visited_cells):
-    fig, ax = plt.subplots()
-    ax.grid(which='major', axis='both')
-    plt.xlim(0, ROWS)
-    plt.ylim(0, COLS)
-    ax.set_xticks(np.arange(-0.5, ROWS + 0.5, 1))
-    ax.set_yticks(np.arange(-0.5, COLS + 0.5, 1))
-
-    x = [p.x for p in visited_cells]
-    y = [p.y for p in visited_cells]
-    plt.plot(x, y, color='g', label='Visited cells')
-
-    plt.scatter(r.o.x, r.o.y, color='b', label='Origin')
-
-    x_dom = np.arange(-0.5, ROWS + 0.5, 1)
-    fun, _ = r.create_funs()
-    y = [fun(x) for x in x_dom]
-    plt.plot(x_dom, y, color='r', label='Ray direction')
-
-    ax.legend()
-    plt.title('input: \'' + INPUT_F + '\'\n' + \
-        ' RAY: {}, O: {}, D: {}'.format(i, r.o, r.d))
-    if not os.path.exists('./viz'):
-        os.mkdir('./viz')
-    plt.savefig('./viz/' + INPUT_F + '_RAY{}.png'.format(i))
-
-
-def solution(i_content):
-    global ROWS, COLS, N
-
-    icparsed = [int(x) for x in i_content.split()]
-    ROWS, COLS, N = icparsed[0], icparsed[1], icparsed[2]
-    ROWS += 1   # I used range(ROWS) in several occasions so
-    COLS += 1   # this seemed like an OK quick fix
-    rays = _parse_rays(icparsed)
-    
-    o_content_raw = []
-    for i, r in enumerate(rays):
-        visited_cells = r.get_cells(ROWS, COLS)
-
-        _visualize(i, r, visited_cells)
-
-        o_content_raw.append(visited_cells)
-    return o_content_raw
+    return inputfilepath, outputfilepath, workers, visualize, cache_mb, density, profiling
+
+
+def solution(icparsed, out, workers=1, renderer=None, cache=None):
+    '''
+    Writes the visited cells of every ray to the out RowWriter, one row
+    per ray. Rays are traced and written one chunk at a time, with more
+    than one worker the chunks are traced in a process pool, and unless
+    they are rendered also formatted there. With a FootprintCache (single
+    process only) the footprints of rays with the same direction are
+    traced once. If a renderer is given every ray is submitted to it for
+    visualization.
+
+    params:
+        icparsed: array of all the integers in the input file
+    '''
+    rows, cols, n = _parse_size(icparsed)
+
+    # visited cells of the rays in a chunk, the i-th ray's cells are
+    # xs[offsets[i]:offsets[i+1]], ys[offsets[i]:offsets[i+1]]
+    with profile.phase('parse'):
+        origins, directions = parse_rays(icparsed, n)
+    profile.count('rays', n)
+
+    if workers > 1 and not renderer:
+        # the workers format their chunks too, only the bytes are written here
+        formatted = iter_format_rays_parallel(origins, directions, rows, cols, workers)
+        for _, rays, cells, data in profile.timed_iter(formatted, 'trace'):
+            profile.count('visited_cells', cells)
+            with profile.phase('output'):
+                out.write_formatted(data, rays)
+        return
+
+    chunks = profile.timed_iter(_iter_chunks(origins, directions, rows, cols, workers, cache), 'trace')
+    for start, offsets, xs, ys in chunks:
+        profile.count('visited_cells', len(xs))
+        if renderer:
+            with profile.phase('visualize'):
+                for i in range(len(offsets) - 1):
+                    renderer.submit(start + i, rows, cols, origins[start + i], directions[start + i],
+                                    xs[offsets[i]:offsets[i+1]], ys[offsets[i]:offsets[i+1]])
+
+        # every row is x0 y0 x1 y1 ...
+        with profile.phase('output'):
+            out.write_ragged(offsets * 2, np.column_stack((xs, ys)).ravel())
+
+
+def density_solution(icparsed, out, workers=1, cache=None):
+    '''
+    Writes how many rays visit every cell to the out RowWriter, one row
+    per y, the x-th number in a row is the count of the cell (x, y).
+    '''
+    rows, cols, n = _parse_size(icparsed)
+
+    with profile.phase('parse'):
+        origins, directions = parse_rays(icparsed, n)
+    profile.count('rays', n)
+
+    with profile.phase('trace'):
+        density = hit_density(_iter_chunks(origins, directions, rows, cols, workers, cache), rows, cols)
+    with profile.phase('output'):
+        out.write_rows(density.T)
+
+
+def _parse_size(icparsed):
+    rows, cols, n = [int(x) for x in icparsed[:3]]
+    rows += 1   # I used range(rows) in several occasions so
+    cols += 1   # this seemed like an OK quick fix
+    return rows, cols, n
+
+
+def _iter_chunks(origins, directions, rows, cols, workers, cache):
+    if workers > 1:
+        return iter_trace_rays_parallel(origins, directions, rows, cols, workers)
+    elif cache:
+        return cache.iter_trace_rays(origins, directions, rows, cols)
+    return iter_trace_rays(origins, directions, rows, cols)
 
 
 def main(argv):
-    inputfilepath, outputfilepath = _get_inputfilepath(argv)
-    i_content = read_file(inputfilepath)
-
-    o_content_raw = solution(i_content)
-
-    o_content_frmtd = ""
-    for i in range(N):
-        for cell in o_content_raw[i]:
-            o_content_frmtd += str(cell.x) + ' ' + str(cell.y) + ' '
-        o_content_frmtd += '\n'
-    o_content_frmtd = o_content_frmtd[:-1]
-
-    write_to_file(outputfilepath if outputfilepath != None else "your_input.out", o_content_frmtd)
+    inputfilepath, outputfilepath, workers, visualize, cache_mb, density, profiling = _get_inputfilepath(argv)
+    if profiling:
+        profile.enable()
+
+    with profile.phase('parse'):
+        icparsed = read_ints(inputfilepath)
+    cache = FootprintCache(cache_mb << 20) if cache_mb != None else None
+
+    with RowWriter(outputfilepath if outputfilepath != None else "your_input.out") as out:
+        if density:
+            density_solution(icparsed, out, workers, cache)
+        elif not visualize:
+            solution(icparsed, out, workers, cache=cache)
+        else:
+            with RayRenderer(inputfilepath, workers) as renderer:
+                solution(icparsed, out, workers, renderer, cache)
+
+    if cache:
+        print('Footprint cache: ' + str(cache.stats()), file=sys.stderr)
+        for name, value in cache.stats().items():
+            profile.count('footprint_' + name, value)
+    if profiling:
+        profile.dump(level=4, input=inputfilepath, workers=workers)
 
 
 if __name__ == "__main__":
@@ -69,16 +69,33 @@ class Ray:
 
 
     def get_cells(self, rows, cols):
-        f, f_inv = self.create_funs()
-
-        # returns indexes of cells that ought to be visited
-        cell_indexes = self._get_indexes(rows, cols)
-        visited_cells = []
-        for cell in cell_indexes:
-            if self._visited(cell, f, f_inv):
-                visited_cells.append(cell)
-        
-        return visited_cells
+        return list(self.iter_cells(rows, cols))
+
+    def iter_cells(self, rows, cols, max_cells=None, until=None, bbox=None):
+        '''
+        Yields the visited cells one by one, in the same order get_cells
+        returns them. Nothing is computed ahead of the consumer.
+
+        params:
+            max_cells: stop after yielding this many cells
+            until: predicate, stop after yielding the first cell it accepts
+            bbox: (x_min, y_min, x_max, y_max), only cells inside the box
+                are yielded and the traversal stops once the ray leaves it
+        '''
+        if max_cells is not None and max_cells <= 0:
+            return
+        d = self._test_direction
+
+        count = 0
+        for cell in self._iter_indexes(rows, cols, bbox):
+            if bbox and not (bbox[0] <= cell.x <= bbox[2] and bbox[1] <= cell.y <= bbox[3]):
+                continue
+            if not self._visited(cell, d):
+                continue
+            yield cell
+            count += 1
+            if count == max_cells or (until and until(cell)):
+                return
 
     # This could be rewritten as a property
     @property
@@ -100,86 +117,89 @@ class Ray:
         else:
             return AXIS.Y
 
-    def _get_indexes(self, rows, cols):
-        indexes = []
-
-        if self.quadrant == QUADRANT.TL:
-            # i se smanjuje, j povecava
-            if self.dom_axis == AXIS.X:
-                for j in range(self.o.y, cols, 1):
-                    for i in range(self.o.x, -1, -1):
-                        indexes.append(Point(i, j))
-            else:
-                for i in range(self.o.x, -1, -1):
-                    for j in range(self.o.y, cols, 1):
-                        indexes.append(Point(i, j))
-        elif self.quadrant == QUADRANT.TR:
-            # i se povecava, j povecava
-            if self.dom_axis == AXIS.X:
-                for j in range(self.o.y, cols, 1):
-                    for i in range(self.o.x, rows, 1):
-                        indexes.append(Point(i, j))
-            else:
-                for i in range(self.o.x, rows, 1):
-                    for j in range(self.o.y, cols, 1):
-                        indexes.append(Point(i, j))
-        elif self.quadrant == QUADRANT.BL:
-            # i se smanjuje, j smanjuje
-            if self.dom_axis == AXIS.X:
-                for j in range(self.o.y, -1, -1):
-                    for i in range(self.o.x, -1, -1):
-                        indexes.append(Point(i, j))
-            else:
-                for i in range(self.o.x, -1, -1):
-                    for j in range(self.o.y, -1, -1):
-                        indexes.append(Point(i, j))
-        elif self.quadrant == QUADRANT.BR:
-            # i se povecava, j smanjuje
-            if self.dom_axis == AXIS.X:
-                for j in range(self.o.y, -1, -1):
-                    for i in range(self.o.x, rows, 1):
-                        indexes.append(Point(i, j))
-            else:
-                for i in range(self.o.x, rows, 1):
-                    for j in range(self.o.y, -1, -1):
-                        indexes.append(Point(i, j))
-
-        return indexes
-
-    def _visited(self, cell, f, f_inv):
-
-        bl_point = Point(cell.x - 0.5, cell.y - 0.5)
-        tl_point = Point(cell.x - 0.5, cell.y + 0.5)
-        tr_point = Point(cell.x + 0.5, cell.y + 0.5)
-        br_point = Point(cell.x + 0.5, cell.y - 0.5)
-
-        # Four cases - L, R, T or B visited
-        if self._h_visited(bl_point, tl_point, f):
-            return True
-        elif self._h_visited(br_point, tr_point, f):
-            return True
-        elif self._v_visited(bl_point, br_point, f_inv):
-            return True
-        elif self._v_visited(tl_point, tr_point, f_inv):
-            return True
-    
-    def _h_visited(self, bottom_point, top_point, f):
-        # Case when d = (0, c)
-        if not f:
-            return False
-
-        f_hor = f(bottom_point.x) # equal to f(top_point.x)
-        if f_hor >= bottom_point.y and f_hor <= top_point.y:
-            return True
-
-    def _v_visited(self, left_point, right_point, f_inv):
-        if f_inv == None:
-            return False
-
-        f_inv_ver = f_inv(left_point.y) # equal to f_inv(right_point.y)
-        if f_inv_ver >= left_point.x and f_inv_ver <= right_point.x:
-            return True
+    def _iter_indexes(self, rows, cols, bbox=None):
+        '''
+        Yields the indexes of the cells that ought to be tested, in the
+        same order the whole quadrant would be scanned in. For every line
+        of the outer axis only the band of cells around the ray is listed,
+        so a ray yields O(rows + cols) candidates instead of O(rows * cols).
+        With a bbox the quadrant ends at the far edge of the box.
+        '''
+        if self.quadrant in (QUADRANT.TL, QUADRANT.BL):
+            step_x, end_x = -1, -1 if not bbox else max(-1, bbox[0] - 1)
+        else:
+            step_x, end_x = 1, rows if not bbox else min(rows, bbox[2] + 1)
+        if self.quadrant in (QUADRANT.TL, QUADRANT.TR):
+            step_y, end_y = 1, cols if not bbox else min(cols, bbox[3] + 1)
+        else:
+            step_y, end_y = -1, -1 if not bbox else max(-1, bbox[1] - 1)
+
+        if self.dom_axis == AXIS.X:
+            for j in range(self.o.y, end_y, step_y):
+                band = self._band(j - self.o.y, self.d.y, self.d.x, self.o.x, step_x, end_x)
+                if not band:
+                    break
+                for i in band:
+                    yield Point(i, j)
+        else:
+            for i in range(self.o.x, end_x, step_x):
+                band = self._band(i - self.o.x, self.d.x, self.d.y, self.o.y, step_y, end_y)
+                if not band:
+                    break
+                for j in band:
+                    yield Point(i, j)
+
+    @staticmethod
+    def _band(offset, d_outer, d_inner, o_inner, step, end):
+        '''
+        Returns the range of inner-axis indexes the ray can cross on the
+        outer-axis line which is `offset` cells away from the origin. The
+        range is widened by one cell on both sides, _visited decides which
+        of the cells are actually crossed.
+        '''
+        # case when direction of the ray is (0, 0), only the origin's
+        # line on the inner axis is crossed
+        if d_outer == 0 and d_inner == 0:
+            return range(o_inner, o_inner + step, step)
+        # case when the ray is parallel to the inner axis
+        if d_outer == 0:
+            return range(o_inner, end, step) if offset == 0 else range(0)
+
+        # inner offsets at which the ray enters and leaves the line, as
+        # fractions u1 / den and u2 / den
+        u1, u2, den = (2*offset - 1) * d_inner, (2*offset + 1) * d_inner, 2 * d_outer
+        if den < 0:
+            u1, u2, den = -u1, -u2, -den
+        lo = o_inner + min(u1, u2) // den - 1
+        hi = o_inner - (-max(u1, u2) // den) + 1
+
+        if step > 0:
+            lo, hi = max(lo, o_inner), min(hi, end - 1)
+            return range(lo, hi + 1) if lo <= hi else range(0)
+        lo, hi = max(lo, end + 1), min(hi, o_inner)
+        return range(hi, lo - 1, -1) if lo <= hi else range(0)
+
+    def _visited(self, cell, d=None):
+        '''
+        Is the cell's square (edges included) crossed by the line the ray
+        lies on. With the corners at (x +- 1/2, y +- 1/2), the cross
+        product of the direction and (corner - origin) takes all of its
+        values in base +- (|d.x| + |d.y|), where base is the value at the
+        cell's centre, so the line crosses the square iff that interval
+        contains 0. Everything is doubled to stay in integers, so the test
+        is exact for any coordinates.
+        '''
+        d = d or self._test_direction
+        base = 2 * (d.x * (cell.y - self.o.y) - d.y * (cell.x - self.o.x))
+        return abs(base) <= abs(d.x) + abs(d.y)
 
+    @property
+    def _test_direction(self):
+        # a ray with direction (0, 0) visits its origin's column, the same
+        # cells as a ray parallel to the y-axis
+        if self.d.x == 0 and self.d.y == 0:
+            return Point(0, 1)
+        return self.d
 
     def __str__(self):
         return "Ray(o=" + str(self.o) + ", d=" + str(self.d) + ")"
\ No newline at end of file
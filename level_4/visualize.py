@@ -0,0 +1,95 @@
+'''
+    Note:
+        - matplotlib is imported only by the rendering workers, with the
+        non-interactive Agg backend, so importing this module is cheap.
+'''
+
+# Generic/Built-in Libs
+import os
+from collections import deque
+from multiprocessing import Pool
+
+# Other imports
+from model import Ray
+
+# Rays submitted per worker that may wait to be rendered, submit blocks
+# beyond that
+PENDING_PER_WORKER = 4
+
+
+class RayRenderer:
+    '''
+    Renders one PNG per ray into the viz folder. Rendering runs in a pool
+    of background processes, every figure is closed once it is saved.
+    Rendering is much slower than tracing, so submit waits for the oldest
+    ray once too many are pending, instead of queueing every ray's cells.
+    '''
+
+    def __init__(self, input_f, workers=1):
+        self.input_f = input_f
+        if not os.path.exists('./viz'):
+            os.mkdir('./viz')
+        self.pool = Pool(workers)
+        self.pending = deque()
+        self.max_pending = workers * PENDING_PER_WORKER
+
+    def submit(self, i, rows, cols, origin, direction, xs, ys):
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft().get()
+        # copies, so that the task does not keep the whole chunk alive
+        task = (self.input_f, rows, cols, i,
+                tuple(int(v) for v in origin), tuple(int(v) for v in direction), xs.copy(), ys.copy())
+        self.pending.append(self.pool.apply_async(_render_ray, (task,)))
+
+    def close(self):
+        '''Waits for all the submitted rays to be rendered.'''
+        self.pool.close()
+        for result in self.pending:
+            result.get()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _render_ray(task):
+    import numpy as np
+    plt = _pyplot()
+
+    input_f, rows, cols, i, origin, direction, xs, ys = task
+    r = Ray(origin[0], origin[1], direction[0], direction[1])
+
+    fig, ax = plt.subplots()
+    ax.grid(which='major', axis='both')
+    ax.set_xlim(0, rows)
+    ax.set_ylim(0, cols)
+    ax.set_xticks(np.arange(-0.5, rows + 0.5, 1))
+    ax.set_yticks(np.arange(-0.5, cols + 0.5, 1))
+
+    ax.plot(xs, ys, color='g', label='Visited cells')
+
+    ax.scatter(r.o.x, r.o.y, color='b', label='Origin')
+
+    fun, _ = r.create_funs()
+    # case when the ray is parallel to the y-axis
+    if fun is None:
+        ax.plot([r.o.x, r.o.x], [-0.5, cols + 0.5], color='r', label='Ray direction')
+    else:
+        x_dom = np.arange(-0.5, rows + 0.5, 1)
+        ax.plot(x_dom, [fun(x) for x in x_dom], color='r', label='Ray direction')
+
+    ax.legend()
+    ax.set_title('input: \'' + input_f + '\'\n' + \
+        ' RAY: {}, O: {}, D: {}'.format(i, r.o, r.d))
+    fig.savefig('./viz/' + input_f + '_RAY{}.png'.format(i))
+    plt.close(fig)
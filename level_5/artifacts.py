@@ -0,0 +1,82 @@
+'''
+    Note:
+        - The capitals, the country graph and the distances between the
+        capitals depend only on the map block of the input (everything
+        after the solars), so they are stored under a hash of that block
+        and reused by every input with the same map.
+        - Every artifact is a plain .npy file, loaded memory-mapped so
+        nothing is read until it is used.
+'''
+
+# Generic/Built-in Libs
+import os
+import hashlib
+import shutil
+import tempfile
+import numpy as np
+
+# Other imports
+from model import Cell, CountryGraph
+
+# Bumped whenever the stored artifacts change meaning
+FORMAT_VERSION = 1
+
+_FILES = ['capitals', 'offsets', 'targets', 'weights', 'distances']
+
+
+def map_key(icparsed, k, rows, cols):
+    '''Returns the hex digest of the map block of the parsed input.'''
+    block = np.ascontiguousarray(icparsed[k*2+1:k*2+3 + rows*cols*2], dtype=np.int64)
+    digest = hashlib.sha256(b'level5-v%d:' % FORMAT_VERSION)
+    digest.update(memoryview(block).cast('B'))
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    '''
+    Directory of derived map artifacts, one subdirectory of .npy files per
+    map key.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def load(self, key):
+        '''
+        Returns the (capitals, graph, distances) stored under the key, or
+        None if there are none. The arrays are read-only memory maps.
+        '''
+        path = os.path.join(self.directory, key)
+        if not os.path.isdir(path):
+            return None
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in _FILES}
+
+        capitals = [Cell(x=x, y=y, altitude=altitude if has_altitude else None, country=i)
+                    for i, (x, y, altitude, has_altitude) in enumerate(arrays['capitals'].tolist())]
+        graph = CountryGraph(arrays['offsets'], arrays['targets'], arrays['weights'])
+        return capitals, graph, arrays['distances']
+
+    def store(self, key, capitals, graph, distances):
+        '''
+        Stores the artifacts under the key. They are written to a temporary
+        directory which is then renamed, so a reader never sees a partly
+        written entry.
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, key)
+        tmp = tempfile.mkdtemp(prefix='.' + key, dir=self.directory)
+        try:
+            caps = np.array([[cap.x, cap.y, cap.altitude or 0, cap.altitude is not None] for cap in capitals],
+                            dtype=np.int64).reshape(len(capitals), 4)
+            arrays = {'capitals': caps, 'offsets': graph.offsets, 'targets': graph.targets,
+                      'weights': graph.weights, 'distances': np.asarray(distances, dtype=np.int32)}
+            for name in _FILES:
+                np.save(os.path.join(tmp, name + '.npy'), arrays[name])
+            os.rename(tmp, path)
+        except OSError:
+            # another process stored the same map first
+            if not os.path.isdir(path):
+                raise
+        finally:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp)
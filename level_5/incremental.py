@@ -0,0 +1,142 @@
+'''
+    Note:
+        - A cell only changes the border of its own country and of the
+        country it moves to, so only those two countries' capitals can
+        move. Edges change only for them and for the countries of the
+        cells next to the moved cells.
+        - The whole V x V distance matrix and C x K cost matrix are kept
+        in memory.
+'''
+
+# Generic/Built-in Libs
+import numpy as np
+
+# Other imports
+from common import profile
+from model import MAX_DIST, CountryGraph, cost_matrix
+from paths import all_pairs, iter_distances
+
+
+class Model:
+    '''
+    The level 5 solution of one map kept in memory. Changing solar prices
+    or moving cells between countries updates only the parts of the
+    solution that depend on them.
+    '''
+
+    def __init__(self, matrix, solar_countries, prices):
+        self.matrix = matrix
+        self.solar_countries = np.asarray(solar_countries, dtype=np.int64)
+        self.prices = np.array(prices, dtype=np.int64)
+
+        self.capitals, self.country_cells = matrix.find_capitals()
+        for capital in self.capitals:
+            if capital is None:
+                raise ValueError('a country has no cell off the border')
+        self.graph = matrix.find_neighbours(self.capitals)
+        self.distances = all_pairs(self.graph)
+        self.costs = cost_matrix(self.distances, self.solar_countries, self.prices)
+
+    def set_prices(self, solars, prices):
+        '''Changes the prices of the solars with the given indexes.'''
+        solars = np.asarray(solars, dtype=np.int64)
+        self.prices[solars] = prices
+        self.costs[:, solars] = self.distances[:, self.solar_countries[solars]] + self.prices[solars]
+
+    def reassign_cells(self, xs, ys, countries):
+        '''
+        Moves the cells (xs[i], ys[i]) to the given countries. Raises
+        ValueError, leaving the model as it was, if a country id is not
+        valid or a country would be left without a capital. Returns the
+        countries whose rows of distances and costs were recomputed.
+        '''
+        matrix = self.matrix
+        n = len(self.capitals)
+        xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+        countries = np.broadcast_to(np.asarray(countries, dtype=np.int64), xs.shape)
+        if len(countries) and (countries.min() < 0 or countries.max() >= n):
+            raise ValueError('country ids must be in [0, {}]'.format(n - 1))
+
+        old = matrix.country[ys, xs].copy()
+        matrix.set_countries(xs, ys, countries)
+        # a cell given twice ends up in the last of its countries
+        new = matrix.country[ys, xs]
+        flat = ys * matrix.rows + xs
+
+        # new cells and capitals of the countries that lost or got cells
+        country_cells, capitals = {}, list(self.capitals)
+        for country in np.unique(np.concatenate((old, new))).tolist():
+            lost, got = flat[(old == country) & (new != country)], flat[(new == country) & (old != country)]
+            cells = np.union1d(np.setdiff1d(self.country_cells[country], lost), got)
+            capital = matrix.find_capital(country, cells) if len(cells) else None
+            if capital is None:
+                matrix.set_countries(xs, ys, old)
+                raise ValueError('country {} would have no cell off the border'.format(country))
+            country_cells[country], capitals[country] = cells, capital
+        self.country_cells.update(country_cells)
+        self.capitals = capitals
+
+        graph = self._update_graph(xs, ys, list(country_cells))
+        sources = _changed_sources(self.distances, self.graph, graph)
+        self.graph = graph
+
+        for source, row in zip(sources.tolist(), iter_distances(graph, sources.tolist())):
+            self.distances[source] = row
+        self.costs[sources] = cost_matrix(self.distances[sources], self.solar_countries, self.prices)
+        profile.count('recomputed_sources', len(sources))
+        return sources
+
+    def _update_graph(self, xs, ys, moved):
+        '''
+        Returns the graph with the edges of the countries around the moved
+        cells found again and all the weights taken from the new capitals.
+        '''
+        matrix = self.matrix
+        n = len(self.capitals)
+
+        # countries of the moved cells and of the cells next to them
+        around_x = np.concatenate((xs - 1, xs + 1, xs, xs))
+        around_y = np.concatenate((ys, ys, ys - 1, ys + 1))
+        inside = (around_x >= 0) & (around_y >= 0) & (around_x < matrix.rows) & (around_y < matrix.cols)
+        changed = np.unique(np.concatenate((moved, matrix.country[around_y[inside], around_x[inside]])))
+
+        sources = np.repeat(np.arange(n), np.diff(self.graph.offsets))
+        keep = ~np.isin(sources, changed)
+        parts = [sources[keep] * n + self.graph.targets[keep]]
+        for country in changed.tolist():
+            parts.append(country * n + matrix.country_neighbours(country, self.country_cells[country]))
+        pairs = np.sort(np.concatenate(parts))
+        return CountryGraph.from_edges(n, pairs // n, pairs % n, self.capitals)
+
+
+def _changed_sources(distances, old, new):
+    '''
+    Returns the sources whose distances can differ between the old and the
+    new graph. A source is affected by an edge that got longer or was
+    removed only if the edge was on one of its shortest paths, and by an
+    edge that got shorter or was added only if it shortens a path.
+    '''
+    n = len(old)
+    old_keys = np.repeat(np.arange(n), np.diff(old.offsets)) * n + old.targets
+    new_keys = np.repeat(np.arange(n), np.diff(new.offsets)) * n + new.targets
+
+    # the weight every edge has in the other graph, -1 if it is not there
+    new_of_old = _weights_of(old_keys, new_keys, new.weights)
+    old_of_new = _weights_of(new_keys, old_keys, old.weights)
+
+    worse = (new_of_old == -1) | (new_of_old > old.weights)
+    better = (old_of_new == -1) | (old_of_new > new.weights)
+
+    affected = np.zeros(n, dtype=bool)
+    u, v, w = old_keys[worse] // n, old_keys[worse] % n, old.weights[worse]
+    affected |= ((distances[:, u] + w == distances[:, v]) & (distances[:, v] < MAX_DIST)).any(axis=1)
+    u, v, w = new_keys[better] // n, new_keys[better] % n, new.weights[better]
+    affected |= ((distances[:, u] + w < distances[:, v]) & (distances[:, u] < MAX_DIST)).any(axis=1)
+    return np.flatnonzero(affected)
+
+
+def _weights_of(keys, graph_keys, graph_weights):
+    if len(graph_keys) == 0:
+        return np.full(len(keys), -1, dtype=np.int64)
+    i = np.searchsorted(graph_keys, keys).clip(max=len(graph_keys) - 1)
+    return np.where(graph_keys[i] == keys, graph_weights[i], -1)
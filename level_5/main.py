@@ -1,160 +1,183 @@
 # Generic/Built-in Libs
 import sys, getopt, os
 from collections import namedtuple
-import matplotlib.pyplot as plt
-import numpy as np
 
 # Other imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.reader import read_ints
+from common.writer import RowWriter
+from common import profile
 from model import *
-
-# Globals
-ROWS, COLS, K = 0, 0, 0
-INPUT_F = None
+from paths import all_pairs, iter_distance_blocks, BLOCK_ROWS
+from artifacts import ArtifactCache, map_key
+from tiled import TiledMap, read_header, map_path
+from visualize import render_map
 
 def _get_inputfilepath(argv):
     """Parses the command-line arguments. Returns the output file path."""
-    global INPUT_F
-
     inputfilepath = None
     outputfilepath = None
+    workers = 1
+    artifacts = None
+    tiled = False
+    visualize = False
+    profiling = False
     try:
-        opts, args = getopt.getopt(argv,"i:o:h")
+        opts, args = getopt.getopt(argv,"i:o:hv",["workers=", "artifacts=", "tiled", "profile"])
     except getopt.GetoptError:
-        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> -h')
+        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> --workers <n> --artifacts <dir> --tiled --profile -v -h')
         sys.exit(2)
     found = False
     for opt, arg in opts:
         if opt == '-h':
-            print('Usage: example.py -i <inputfilepath> -o <outputfilepath>')
+            print('Usage: example.py -i <inputfilepath> -o <outputfilepath> --workers <n> --artifacts <dir> --tiled --profile -v')
             sys.exit()
         elif opt == '-i':
             inputfilepath = arg
-            INPUT_F = inputfilepath
             found = True
         elif opt == '-o':
             outputfilepath = arg
+        elif opt == '--workers':
+            workers = int(arg)
+        elif opt == '--artifacts':
+            artifacts = arg
+        elif opt == '--tiled':
+            tiled = True
+        elif opt == '--profile':
+            profiling = True
+        elif opt == '-v':
+            visualize = True
     if not found:
         print('ERROR.')
-        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> -h')
+        print('Usage: example.py -i <inputfilepath> -o <outputfilepath> --workers <n> --artifacts <dir> --tiled --profile -v -h')
         sys.exit()
 
-    return inputfilepath, outputfilepath
-
-
-def read_file(filename):
-    f = open(filename, 'r')
-    return f.read()
-
+    return inputfilepath, outputfilepath, workers, artifacts, tiled, visualize, profiling
 
-def write_to_file(filename, content):
-    f = open(filename, 'w')
-    f.write(content)
 
-def _parse_solars(icparsed):
-    global K
-
-    solar_panels = []
+def _parse_solars(icparsed, k):
+    '''Returns the arrays of the solars' countries and prices.'''
     # first index: 1
     # last index: k*2
-    for i in range(1, K*2+1, 2):
-        s = Solar(country=icparsed[i], price=icparsed[i+1])
-        solar_panels.append(s)
-    return solar_panels
-
-def _parse_matrix(icparsed):
-    global ROWS, COLS, K
-    matrix = Matrix()
-
-    index = 1 + K*2 + 2
-    for i in range(COLS):
-        column = []
-        for j in range(ROWS):
-            column.append(Cell(
-                x=j, 
-                y=i, 
-                altitude=icparsed[index], 
-                country=icparsed[index+1]))
-            index += 2
-        matrix.append(column)
-    return matrix 
-
-
-def _visualize(capitals, neighbours):
-    fig, ax = plt.subplots()
-    ax.grid(which='major', axis='both')
-    plt.xlim(0, ROWS-1)
-    plt.ylim(0, COLS-1)
-
-    plotted = set()
-    for capital in capitals:
-        plt.scatter(capital.x, capital.y, color='r')
-        plt.text(capital.x, capital.y, "Country:" + str(capital.country))
-        for neighbour in neighbours[capital.country]:
-            n_capital = capitals[neighbour]
-            # plot again
-            plt.plot([capital.x, n_capital.x], [capital.y, n_capital.y], color='b')
-            # plot distance
-            x_avg, y_avg = (capital.x + n_capital.x) / 2, (capital.y + n_capital.y) / 2 
-            plt.text(x_avg, y_avg, euclidean_distance(capital.x, capital.y, n_capital.x, n_capital.y))
-            plotted.add(neighbour)
-    plt.title('input: \'' + INPUT_F + '\'')
-
-    if not os.path.exists('./viz'):
-        os.mkdir('./viz')
-    plt.savefig('./viz/' + INPUT_F + '.png')
-
-
-def solution(i_content):
-    global ROWS, COLS, K
-
-    icparsed = [int(x) for x in i_content.split()]
-    K = icparsed[0]
-    solar_panels = _parse_solars(icparsed)
-
-    ROWS, COLS = icparsed[K*2+1], icparsed[K*2+2]
-    matrix = _parse_matrix(icparsed)
-    
-    # find the capital and the neighbours of every country
-    # Note: capitals[i] returns the capital of i-th country
-    capitals, country_cells = matrix.find_capitals()
-    neighbours = matrix.find_neighbours(capitals, country_cells)
-
-    viz_distances = []
-    o_content_raw = []
-    for country_id, capital in enumerate(capitals):
-        country_solars = []
-
-        # get the mapping: any_capital -> min_distance_to_this_capital
-        md = min_distance(country_id, capitals, neighbours)
-
-        # calculate the costs to collect all the solars in this
-        # capital using the minimum distance mapping
-        for solar in solar_panels:
-            cost = calculate_cost(solar, md, capitals)
-            country_solars.append(cost)
-
-        o_content_raw.append(country_solars)
-        viz_distances.append(md)
-
-    _visualize(capitals, neighbours)
-        
-    return o_content_raw
+    solars = icparsed[1:k*2+1].reshape(k, 2)
+    return solars[:, 0], solars[:, 1]
+
+def _parse_matrix(icparsed, k, rows, cols):
+    index = 1 + k*2 + 2
+    cells = icparsed[index:index + rows*cols*2].reshape(cols, rows, 2)
+    return Matrix.from_planes(cells[:, :, 0], cells[:, :, 1])
+
+
+def solution(icparsed, out, visualize=False, workers=1, artifacts=None, input_f=None):
+    '''
+    Writes the cost of every solar for every country to the out RowWriter,
+    one row per country, a block of countries at a time as soon as their
+    distances are known.
+    With more than one worker the distances are searched in a process
+    pool, the rows are still written in order. With an ArtifactCache the
+    capitals, graph and distances of a map seen before are loaded instead
+    of being found again.
+
+    params:
+        icparsed: array of all the integers in the input file
+        input_f: path of the input file, needed only to visualize
+    '''
+    with profile.phase('parse'):
+        k = int(icparsed[0])
+        solar_countries, prices = _parse_solars(icparsed, k)
+        rows, cols = int(icparsed[k*2+1]), int(icparsed[k*2+2])
+
+    cached = None
+    if artifacts:
+        with profile.phase('artifacts'):
+            key = map_key(icparsed, k, rows, cols)
+            cached = artifacts.load(key)
+        profile.count('artifact_hits' if cached else 'artifact_misses')
+
+    if cached:
+        capitals, graph, distances = cached
+    else:
+        with profile.phase('parse'):
+            matrix = _parse_matrix(icparsed, k, rows, cols)
+
+        # find the capital and the neighbours of every country
+        # Note: capitals[i] returns the capital of i-th country
+        with profile.phase('find_capitals'):
+            capitals, country_cells = matrix.find_capitals()
+        with profile.phase('find_neighbours'):
+            graph = matrix.find_neighbours(capitals)
+
+        # the distances are needed all at once only to be stored
+        if artifacts:
+            with profile.phase('min_distance'):
+                distances = all_pairs(graph, workers)
+            with profile.phase('artifacts'):
+                artifacts.store(key, capitals, graph, distances)
+    profile.count('countries', len(capitals))
+    profile.count('solars', k)
+
+    # the distances from every capital, in blocks of rows in order
+    if artifacts:
+        blocks = (distances[i:i + BLOCK_ROWS] for i in range(0, len(distances), BLOCK_ROWS))
+    else:
+        blocks = iter_distance_blocks(graph, workers)
+    _write_costs(out, blocks, solar_countries, prices)
+
+    if visualize:
+        with profile.phase('visualize'):
+            render_map(input_f, rows, cols, capitals, graph)
+
+
+def tiled_solution(input_f, out, visualize=False, workers=1):
+    '''
+    Same as solution, but the map is read from a memory-mapped copy of
+    it one band of lines at a time, so it never has to fit in memory.
+    '''
+    with profile.phase('parse'):
+        solar_countries, prices, rows, cols = read_header(input_f)
+        tiled = TiledMap(map_path(input_f))
+
+    with profile.phase('find_capitals'):
+        capitals, graph = tiled.find_capitals_and_neighbours()
+    profile.count('countries', len(capitals))
+    profile.count('solars', len(prices))
+
+    _write_costs(out, iter_distance_blocks(graph, workers), solar_countries, prices)
+
+    if visualize:
+        with profile.phase('visualize'):
+            render_map(input_f, rows, cols, capitals, graph)
+
+
+def _write_costs(out, blocks, solar_countries, prices):
+    # Note: md[i][j] returns the distance from the capital of the i-th
+    # country in the block to the capital of the j-th country
+    for md in profile.timed_iter(blocks, 'min_distance'):
+        # calculate the costs to collect all the solars in these
+        # capitals using the minimum distance matrix
+        with profile.phase('costs'):
+            costs = cost_matrix(md, solar_countries, prices)
+
+        with profile.phase('output'):
+            out.write_rows(costs)
 
 
 def main(argv):
-    inputfilepath, outputfilepath = _get_inputfilepath(argv)
-    i_content_raw = read_file(inputfilepath)
-
-    o_content_raw = solution(i_content_raw)
-
-    o_content_frmtd = ""
-    for i in range(len(o_content_raw)):
-        for cost in o_content_raw[i]:
-            o_content_frmtd += str(cost) + ' '
-        o_content_frmtd += '\n'
-    o_content_frmtd = o_content_frmtd[:-1]
-
-    write_to_file(outputfilepath if outputfilepath != None else INPUT_F + ".out", o_content_frmtd)
+    inputfilepath, outputfilepath, workers, artifacts, tiled, visualize, profiling = _get_inputfilepath(argv)
+    if profiling:
+        profile.enable()
+
+    with RowWriter(outputfilepath if outputfilepath != None else inputfilepath + ".out") as out:
+        if tiled:
+            tiled_solution(inputfilepath, out, visualize, workers)
+        else:
+            with profile.phase('parse'):
+                icparsed = read_ints(inputfilepath)
+            solution(icparsed, out, visualize, workers,
+                     ArtifactCache(artifacts) if artifacts != None else None, inputfilepath)
+
+    if profiling:
+        profile.dump(level=5, input=inputfilepath)
 
 
 if __name__ == "__main__":
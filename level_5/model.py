@@ -7,8 +7,12 @@
 # Generic/Built-in Libs
 from collections import namedtuple
 from enum import Enum
+from functools import lru_cache
 from math import sqrt
-import heapq
+import numpy as np
+
+# Other imports
+from common import profile
 
 Solar = namedtuple('Solar', ['country', 'price'])
 Cell = namedtuple('Cell', ['x', 'y', 'altitude', 'country'])
@@ -16,190 +20,330 @@ Point = namedtuple('Point', ['x', 'y'])
 
 MAX_DIST = 1000000
 
+# Largest distance around a cell searched ring by ring by _find_closest,
+# past it the country's cells are scanned
+MAX_SEARCH_RADIUS = 1 << 8
+
+# Number of capitals whose costs cheapest_solars computes at once
+COST_BLOCK_ROWS = 256
+
 class Matrix:
+    '''
+    The map, stored as two int32 planes indexed [y, x]: the altitude and
+    the country of every cell. Cells are built only when asked for.
+    '''
     def __init__(self):
-        self.matrix = []
-    
+        self.altitude = np.zeros((0, 0), dtype=np.int32)
+        self.country = np.zeros((0, 0), dtype=np.int32)
+        self._border = None
+        self._interior = None
+
+    @classmethod
+    def from_planes(cls, altitude, country):
+        matrix = cls()
+        matrix.altitude = np.ascontiguousarray(altitude, dtype=np.int32)
+        matrix.country = np.ascontiguousarray(country, dtype=np.int32)
+        return matrix
+
     def append(self, lst):
-        self.matrix.append(lst)
+        altitude = np.array([[cell.altitude for cell in lst]], dtype=np.int32)
+        country = np.array([[cell.country for cell in lst]], dtype=np.int32)
+        if self.cols == 0:
+            self.altitude, self.country = altitude, country
+        else:
+            self.altitude = np.vstack((self.altitude, altitude))
+            self.country = np.vstack((self.country, country))
+        self._border = None
+        self._interior = None
 
     def get_column(self, i):
-        return self.matrix[i]
+        return [self.cell(j, i) for j in range(self.rows)]
+
+    def cell(self, x, y):
+        return Cell(x=x, y=y, altitude=int(self.altitude[y, x]), country=int(self.country[y, x]))
 
     def __str__(self):
         s = ""
-        for i in range(len(self.matrix)):
-            for j in range(len(self.matrix[i])):
-                s += str(self.matrix[i][j]) + "\t"
+        for i in range(self.cols):
+            for cell in self.get_column(i):
+                s += str(cell) + "\t"
             s += "\n"
         return s
 
     @property
     def cols(self):
-        return len(self.matrix)
+        return self.country.shape[0]
 
     @property
     def rows(self):
-        return len(self.matrix[0])
-
-
-    def _on_border(self, cell):
-        # is it on the edge of the matrix
-        if (cell.x == 0 or cell.y == 0 or cell.x == self.rows - 1 or cell.y == self.cols - 1):
-            return True
-        
-        # is one of it's neighbours a cell from a different country
-        if (self.matrix[cell.y][cell.x-1].country != cell.country):
-            return True
-        if (self.matrix[cell.y][cell.x+1].country != cell.country):
-            return True
-        if (self.matrix[cell.y-1][cell.x].country != cell.country):
-            return True
-        if (self.matrix[cell.y+1][cell.x].country != cell.country):
-            return True
-
-        return False
+        return self.country.shape[1]
 
+    @property
+    def border(self):
+        '''
+        Boolean plane [y, x], True for the border cells: cells on the edge
+        of the matrix and cells with a neighbour from a different country.
+        Computed once for the whole map.
+        '''
+        if self._border is None:
+            c = self.country
+            border = np.ones(c.shape, dtype=bool)
+            inner = c[1:-1, 1:-1]
+            border[1:-1, 1:-1] = ((inner != c[1:-1, :-2]) | (inner != c[1:-1, 2:]) |
+                                  (inner != c[:-2, 1:-1]) | (inner != c[2:, 1:-1]))
+            self._border = border
+            profile.count('border_checks', c.size)
+        return self._border
 
-    def _mhtn_dist(self, cell1, cell2):
-        return abs(cell1.x - cell2.x) + abs(cell1.y - cell2.y)
+    @property
+    def interior(self):
+        '''
+        Plane [y, x] with the country of every cell which is not on the
+        border and -1 for the border cells.
+        '''
+        if self._interior is None:
+            self._interior = np.where(self.border, -1, self.country)
+        return self._interior
+
+    def set_countries(self, xs, ys, countries):
+        '''
+        Moves the cells (xs[i], ys[i]) to the given countries. The border
+        and interior planes, if already computed, are updated only around
+        the moved cells.
+        '''
+        xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+        self.country[ys, xs] = countries
+        if self._border is None:
+            self._interior = None
+            return
+
+        # only the moved cells and the cells next to them can change
+        xs = np.concatenate((xs, xs - 1, xs + 1, xs, xs))
+        ys = np.concatenate((ys, ys, ys, ys - 1, ys + 1))
+        inside = (xs >= 0) & (ys >= 0) & (xs < self.rows) & (ys < self.cols)
+        xs, ys = xs[inside], ys[inside]
+
+        c = self.country
+        border = (xs == 0) | (ys == 0) | (xs == self.rows - 1) | (ys == self.cols - 1)
+        inner = ~border
+        x, y, own = xs[inner], ys[inner], c[ys[inner], xs[inner]]
+        border[inner] = ((c[y, x - 1] != own) | (c[y, x + 1] != own) |
+                         (c[y - 1, x] != own) | (c[y + 1, x] != own))
+        self._border[ys, xs] = border
+        if self._interior is not None:
+            self._interior[ys, xs] = np.where(border, -1, c[ys, xs])
 
     def _find_closest(self, cell, cells):
-        min_dist = self.rows + self.cols + 2
-        closest_cell = None
-        for cell2 in cells:
-            # IMPORTANT
-            if self._on_border(cell2):
-                continue
-            dist = self._mhtn_dist(cell, cell2) 
-            if dist < min_dist:
-                min_dist = dist
-                closest_cell = cell2
-            elif dist == min_dist:
-                if cell2.x < closest_cell.x:
-                    min_dist = dist
-                    closest_cell = cell2
-        return closest_cell
-
+        '''
+        Returns the country's cell closest to the given cell (Manhattan
+        distance) which is not on the border. Ties go to the smallest x,
+        then to the smallest y.
+
+        The rings of cells at distance 0 to 1, 2, 3 to 4, 5 to 8, ... are
+        looked up in the map until one of them has an interior cell of the
+        country, so the work is proportional to the area around the cell
+        that has to be searched. Once that area would be larger than the
+        country, or past MAX_SEARCH_RADIUS, the interior cells are scanned
+        instead.
+
+        params:
+            cells: flat indexes (y * rows + x) of the country's cells
+        '''
+        r = 1
+        while 2 * r * r < len(cells) and r <= MAX_SEARCH_RADIUS:
+            dx, dy = _ring(r)
+            xs, ys = cell.x + dx, cell.y + dy
+            inside = (xs >= 0) & (ys >= 0) & (xs < self.rows) & (ys < self.cols)
+            xs, ys = xs[inside], ys[inside]
+            found = self.interior[ys, xs] == cell.country
+            if found.any():
+                xs, ys = xs[found], ys[found]
+                dist = np.abs(xs - cell.x) + np.abs(ys - cell.y)
+                closest = np.lexsort((ys, xs, dist))[0]
+                return self.cell(int(xs[closest]), int(ys[closest]))
+            r *= 2
+
+        cells = cells[~self.border.ravel()[cells]]
+        if len(cells) == 0:
+            return None
+        ys, xs = np.divmod(cells, self.rows)
+        dist = np.abs(xs - cell.x) + np.abs(ys - cell.y)
+        closest = np.lexsort((ys, xs, dist))[0]
+        return self.cell(int(xs[closest]), int(ys[closest]))
+
+
+    def country_cells(self):
+        '''
+        Returns a dictionary (country_id -> flat indexes y * rows + x of the
+        country's cells, in row-major order). The index arrays are views
+        of one sorted array.
+        '''
+        countries = self.country.ravel()
+        order = np.argsort(countries, kind='stable')
+        ends = np.cumsum(np.bincount(countries))
+        starts = ends - np.bincount(countries)
+        return {i: order[starts[i]:ends[i]] for i in range(len(ends))}
 
     def find_capitals(self):
-        # Find the average x, average y
-        # 
-        # Country_data = namedtuple('Country_data', ['xsum', 'ysum', 'n', 'cells'])
-        # 
-        data = {}
-        for row in self.matrix:
-            for cell in row:
-                if cell.country in data:
-                    data[cell.country][0] += cell.x
-                    data[cell.country][1] += cell.y
-                    data[cell.country][2] += 1
-                    data[cell.country][3].append(cell)
-                else:
-                    data[cell.country] = [
-                        cell.x,
-                        cell.y,
-                        1,
-                        [cell]]
+        country_cells = self.country_cells()
+        countries = self.country.ravel()
+        n = len(country_cells)
+
+        # the average x and y of every country
+        ys, xs = np.divmod(np.arange(countries.size), self.rows)
+        sizes = np.bincount(countries, minlength=n)
+        avg_x = np.bincount(countries, weights=xs, minlength=n).astype(np.int64) // sizes
+        avg_y = np.bincount(countries, weights=ys, minlength=n).astype(np.int64) // sizes
+
+        # the average cell is the capital if it belongs to the country and
+        # is not on the border, otherwise the closest such cell is
+        in_country = self.country[avg_y, avg_x] == np.arange(n)
+        is_capital = in_country & ~self.border[avg_y, avg_x]
 
         capitals = []
-        country_cells = {}
-        for i in range(len(data.keys())):
-            c_d = data[i]
-
-            avg_c = Cell(x=c_d[0] // c_d[2], y=c_d[1] // c_d[2], country=i, altitude=None)
-
-            # if the average cell belongs to the country
-            if self.matrix[avg_c.y][avg_c.x].country == i:
-                # and is not on the border
-                if not self._on_border(avg_c):
-                    capitals.append(avg_c)
-                # and is on the border
-                else:
-                    capitals.append(self._find_closest(avg_c, data[i][3]))
-            else:
-                capitals.append(self._find_closest(avg_c, data[i][3]))
-
-            country_cells[i] = data[i][3]
+        for i, (x, y, ok) in enumerate(zip(avg_x.tolist(), avg_y.tolist(), is_capital.tolist())):
+            avg_c = Cell(x=x, y=y, country=i, altitude=None)
+            capitals.append(avg_c if ok else self._find_closest(avg_c, country_cells[i]))
         
         return capitals, country_cells
 
-    def find_neighbours(self, capitals, country_cells):
-        neighbours = {}
-        for capital in capitals:
-            neighbours[capital.country] = []
-            for cell in country_cells[capital.country]:
-                if (cell.x == 0 or cell.y == 0 or cell.x == self.rows - 1 or cell.y == self.cols - 1):
-                    continue
-
-                if (self.matrix[cell.y][cell.x-1].country != cell.country):
-                    neighbours[capital.country].append(self.matrix[cell.y][cell.x-1].country)
-                if (self.matrix[cell.y][cell.x+1].country != cell.country):
-                    neighbours[capital.country].append(self.matrix[cell.y][cell.x+1].country)
-                if (self.matrix[cell.y-1][cell.x].country != cell.country):
-                    neighbours[capital.country].append(self.matrix[cell.y-1][cell.x].country)
-                if (self.matrix[cell.y+1][cell.x].country != cell.country):
-                    neighbours[capital.country].append(self.matrix[cell.y+1][cell.x].country)
-            neighbours[capital.country] = list(set(neighbours[capital.country]))
-        return neighbours
+    def find_capital(self, country, cells):
+        '''
+        Returns the capital of one country, the same cell find_capitals
+        gives it.
+
+        params:
+            cells: flat indexes (y * rows + x) of the country's cells
+        '''
+        ys, xs = np.divmod(cells, self.rows)
+        avg_c = Cell(x=int(xs.sum()) // len(cells), y=int(ys.sum()) // len(cells),
+                     country=country, altitude=None)
+        if self.interior[avg_c.y, avg_c.x] == country:
+            return avg_c
+        return self._find_closest(avg_c, cells)
+
+    def find_neighbours(self, capitals):
+        '''
+        Returns the CountryGraph of the countries whose cells touch. A cell
+        on the edge of the matrix does not make its country a neighbour of
+        the cells next to it, the cells next to it still count it.
+        '''
+        c = self.country
+        inner = c[1:-1, 1:-1]
+        n = len(capitals)
+
+        # (country, neighbouring country) pairs, encoded as country * n + neighbour
+        pairs = []
+        for shifted in (c[1:-1, :-2], c[1:-1, 2:], c[:-2, 1:-1], c[2:, 1:-1]):
+            differ = inner != shifted
+            pairs.append(inner[differ].astype(np.int64) * n + shifted[differ])
+        pairs = np.unique(np.concatenate(pairs))
+
+        return CountryGraph.from_edges(n, pairs // n, pairs % n, capitals)
+
+    def country_neighbours(self, country, cells):
+        '''
+        Returns the sorted array of one country's neighbours, the same ones
+        find_neighbours gives it.
+        '''
+        ys, xs = np.divmod(cells, self.rows)
+        # cells on the edge of the matrix are skipped
+        cells = cells[(xs != 0) & (ys != 0) & (xs != self.rows - 1) & (ys != self.cols - 1)]
+
+        c = self.country.ravel()
+        around = np.concatenate((c[cells - 1], c[cells + 1], c[cells - self.rows], c[cells + self.rows]))
+        return np.unique(around[around != country]).astype(np.int64)
+
+
+class CountryGraph:
+    '''
+    The country adjacency in CSR form. The neighbours of the i-th country
+    are targets[offsets[i]:offsets[i+1]], sorted, and weights holds the
+    euclidean distances between the capitals of every such pair.
+    '''
+    __slots__ = ['offsets', 'targets', 'weights']
+
+    def __init__(self, offsets, targets, weights):
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+
+    @classmethod
+    def from_edges(cls, n, sources, targets, capitals):
+        '''Edges must be sorted by source.'''
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+
+        xs = np.array([cap.x for cap in capitals], dtype=np.int64)
+        ys = np.array([cap.y for cap in capitals], dtype=np.int64)
+        dx, dy = xs[sources] - xs[targets], ys[sources] - ys[targets]
+        weights = np.sqrt(dx * dx + dy * dy).astype(np.int64)
+        return cls(offsets, targets.astype(np.int64), weights)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def neighbours(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i+1]].tolist()
+
+
+@lru_cache(maxsize=16)
+def _ring(r):
+    '''
+    Returns the offsets of the cells at Manhattan distance r // 2 + 1 to
+    r, or 0 to 1 for r = 1.
+    '''
+    d = np.arange(r // 2 + 1, r + 1)
+    counts = 4 * d
+    d = np.repeat(d, counts)
+    quarter, k = np.divmod(np.arange(len(d)) - np.repeat(np.cumsum(counts) - counts, counts), d)
+    # (d - k, k) turned by quarter * 90 degrees
+    a, b = d - k, k
+    dx = np.choose(quarter, (a, -b, -a, b))
+    dy = np.choose(quarter, (b, a, -b, -a))
+    if r == 1:
+        dx, dy = np.append(0, dx), np.append(0, dy)
+    return dx, dy
 
 
 def euclidean_distance(x1, y1, x2, y2):
     return int(sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2))
 
 
-def min_distance(country_id, capitals, neighbours):
+def cost_matrix(distances, solar_countries, prices):
     '''
-    Using Dijkstra's shortest path algorithm finds the shortest path from
-    capital of the country with the country_id ID, hoping over neighbouring countries.
+    Returns the C x K matrix of the costs to collect every solar in every
+    capital: the distance from the capital to the solar's country plus the
+    solar's price.
 
-    params: 
-        neigbours: dictionary (country_id -> list of neighbouring countries' ids)
+    params:
+        distances: C x V array, the distances from C capitals to all of them
+        solar_countries, prices: arrays of the K solars' countries and prices
     '''
-    # the given capital
-    capital = capitals[country_id]
-    
-    # set of visited capitals
-    visited = set() 
-
-    # mapping from any capital to its distance from the given capital
-    capitals_dist = {cap:MAX_DIST for cap in capitals}
-    capitals_dist[capital] = 0
-
-    # heap mantaining the unvisited nodes sorted by distance
-    unvisited = [(0, capital)]
-
-    while not len(unvisited) == 0:
-        # Get the capital which has the smallest distance of the unvisited
-        # capitals.
-        c = heapq.heappop(unvisited)[1]
-        
-        # Calculate the values for the neighbouring capitals
-        for n_country in neighbours[c.country]:
-            n_capital = capitals[n_country]
-            if n_capital in visited:
-                # print("Capital: " + str(capitals[n_country]) + " already visited")
-                continue
-
-            e_d = euclidean_distance(c.x, c.y, n_capital.x, n_capital.y)
-            new_dist = capitals_dist[c] + e_d
-            # print("Distance between capitals: {} and {} is: {}".format(c, n_capital, new_dist))
-            if new_dist < capitals_dist[n_capital]:
-                capitals_dist[n_capital] = new_dist
-
-                # Add to the heap of unvisited capitals
-                if n_capital not in unvisited:
-                    heapq.heappush(unvisited, (capitals_dist[n_capital], n_capital))
-                else:
-                    unvisited.remove(n_capital)
-                    heapq.heappush(unvisited, (capitals_dist[n_capital], n_capital))
-        visited.add(c)
-
-    return capitals_dist
-
-
-def calculate_cost(solar, md, capitals):
-    capital = capitals[solar.country]
-    dist = md[capital]
-    return solar.price + dist
-        
\ No newline at end of file
+    return np.asarray(distances)[:, solar_countries] + prices
+
+
+def cheapest_solars(distances, solar_countries, prices, k, block_rows=COST_BLOCK_ROWS):
+    '''
+    Returns the indexes and the costs of the k cheapest solars for every
+    capital, two C x k arrays sorted by cost, equal costs by solar index.
+    The costs are computed block_rows capitals at a time and only their k
+    cheapest are kept, so memory stays at block_rows x K past the C x k
+    result.
+    '''
+    distances = np.asarray(distances)
+    n = len(solar_countries)
+    k = min(k, n)
+    solars_parts, costs_parts = [], []
+    for i in range(0, len(distances), block_rows):
+        costs = cost_matrix(distances[i:i + block_rows], solar_countries, prices)
+        # costs and indexes packed into one key so that ties are broken by index
+        keys = costs.astype(np.int64) * n + np.arange(n)
+        if k < n:
+            keys = np.partition(keys, k - 1, axis=1)[:, :k]
+        keys.sort(axis=1)
+        solars_parts.append(keys % n)
+        costs_parts.append(keys // n)
+    if not solars_parts:
+        return np.zeros((0, k), dtype=np.int64), np.zeros((0, k), dtype=np.int64)
+    return np.concatenate(solars_parts), np.concatenate(costs_parts)
@@ -0,0 +1,189 @@
+'''
+    Note:
+        - Distances are capped at MAX_DIST, a capital that can not be
+        reached (or only by a path of MAX_DIST or more) is at MAX_DIST,
+        so they fit in int32.
+'''
+
+# Generic/Built-in Libs
+import heapq
+from collections import deque
+from multiprocessing import Pool
+import numpy as np
+
+# Other imports
+from common import profile
+from model import MAX_DIST
+
+# Graphs with at most this many countries are solved with the dense kernel
+DENSE_MAX_NODES = 1024
+
+# Number of distance rows grouped together by iter_blocks, and the most
+# rows a worker searches in one task
+BLOCK_ROWS = 256
+
+# Adjacency lists of the graph the worker processes search, set once per
+# worker by _init_worker
+_WORKER_GRAPH = None
+
+
+def all_pairs(graph, workers=1):
+    '''
+    Returns the V x V int32 matrix of the shortest distances between the
+    capitals, the i-th row holds the distances from the i-th capital.
+    With more than one worker the rows are searched in a process pool.
+    '''
+    n = len(graph)
+    if n <= DENSE_MAX_NODES:
+        return _floyd_warshall(graph)
+    dist = np.empty((n, n), dtype=np.int32)
+    start = 0
+    for block in iter_distance_blocks(graph, workers):
+        dist[start:start + len(block)] = block
+        start += len(block)
+    return dist
+
+
+def iter_distances(graph, sources=None):
+    '''
+    Yields the distances from every source capital (all of them by
+    default), in order, as lists indexed by country id. Only the current
+    row is held in memory unless the graph is small enough for the dense
+    kernel, which is used only when most of the capitals are sources.
+    '''
+    n = len(graph)
+    sources = range(n) if sources is None else sources
+    if n <= DENSE_MAX_NODES and len(sources) * 2 > n:
+        dist = _floyd_warshall(graph)
+        for source in sources:
+            yield dist[source].tolist()
+        return
+
+    adjacency = _adjacency(graph)
+    for source in sources:
+        yield _dijkstra(source, n, *adjacency)
+
+
+def iter_distance_blocks(graph, workers=1, chunk_sources=None):
+    '''
+    Yields the distances from every capital as (m, V) int32 arrays of
+    consecutive rows, in order. With more than one worker the sources are
+    split into chunks which are searched by a pool of worker processes,
+    at most two chunks per worker ahead of the one being yielded.
+    The graph is handed to every worker once when the pool starts (with
+    fork it is simply inherited), tasks only carry the source range.
+
+    params:
+        workers: number of worker processes
+        chunk_sources: number of sources sent to a worker at once, by
+            default the sources are split into about 8 chunks per worker,
+            and never more than BLOCK_ROWS
+    '''
+    n = len(graph)
+    # the dense kernel solves all the sources at once
+    if workers <= 1 or n <= DENSE_MAX_NODES:
+        yield from iter_blocks(iter_distances(graph))
+        return
+    if chunk_sources is None:
+        chunk_sources = min(BLOCK_ROWS, max(1, -(-n // (workers * 8))))
+
+    # the workers' heap counters are lost
+    pending = deque()
+    with Pool(workers, initializer=_init_worker, initargs=(n, _adjacency(graph))) as pool:
+        for start in range(0, n, chunk_sources):
+            pending.append(pool.apply_async(_distances_task, ((start, min(start + chunk_sources, n)),)))
+            if len(pending) > workers * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def iter_blocks(rows, block_rows=BLOCK_ROWS):
+    '''
+    Groups the distance rows yielded by iter_distances into (m, V) int32
+    arrays of at most block_rows rows, in order.
+    '''
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) == block_rows:
+            yield np.array(block, dtype=np.int32)
+            block = []
+    if block:
+        yield np.array(block, dtype=np.int32)
+
+
+def min_distance(country_id, graph):
+    '''
+    Using Dijkstra's shortest path algorithm finds the shortest path from
+    capital of the country with the country_id ID, hoping over neighbouring countries.
+    Returns the list of the distances to every capital.
+
+    params:
+        graph: CountryGraph of the neighbouring countries
+    '''
+    return _dijkstra(country_id, len(graph), *_adjacency(graph))
+
+
+def _adjacency(graph):
+    return graph.offsets.tolist(), graph.targets.tolist(), graph.weights.tolist()
+
+
+def _init_worker(n, adjacency):
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = (n, adjacency)
+
+
+def _distances_task(task):
+    start, end = task
+    n, adjacency = _WORKER_GRAPH
+    return np.array([_dijkstra(source, n, *adjacency) for source in range(start, end)],
+                    dtype=np.int32).reshape(end - start, n)
+
+
+def _dijkstra(source, n, offsets, targets, weights, limit=MAX_DIST):
+    # distance of every capital from the source capital, limit for the
+    # ones that can not be reached in less
+    dist = [limit] * n
+    dist[source] = 0
+
+    # heap of the unvisited capitals, as d * n + capital so that the
+    # entries are plain ints. A capital is pushed again when its distance
+    # drops and the stale entries are skipped when popped.
+    unvisited = [source]
+    pushes, pops = 1, 0
+
+    while unvisited:
+        d, c = divmod(heapq.heappop(unvisited), n)
+        pops += 1
+        if d > dist[c]:
+            continue
+
+        for e in range(offsets[c], offsets[c + 1]):
+            n_country = targets[e]
+            new_dist = d + weights[e]
+            if new_dist < dist[n_country]:
+                dist[n_country] = new_dist
+                heapq.heappush(unvisited, new_dist * n + n_country)
+                pushes += 1
+
+    profile.count('heap_pushes', pushes)
+    profile.count('heap_pops', pops)
+    return dist
+
+
+def _floyd_warshall(graph):
+    '''
+    Dense all-pairs kernel, V relaxation steps over the whole matrix.
+    '''
+    n = len(graph)
+    dist = np.full((n, n), MAX_DIST, dtype=np.int32)
+    sources = np.repeat(np.arange(n), np.diff(graph.offsets))
+    # there are no parallel edges, the targets of a country are unique
+    dist[sources, graph.targets] = np.minimum(graph.weights, MAX_DIST)
+    np.fill_diagonal(dist, 0)
+
+    for k in range(n):
+        np.minimum(dist, dist[:, k, None] + dist[k], out=dist)
+    profile.count('dense_relaxations', n)
+    return dist
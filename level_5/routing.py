@@ -0,0 +1,134 @@
+'''
+    Note:
+        - Edge weights are euclidean distances rounded down, an edge of
+        length L weighs at least L / 2 (capitals are at least one cell
+        apart). The straight line to the target is scaled by the smallest
+        weight / length ratio of the graph, so it never overestimates.
+        - Landmark bounds are taken from distances to and from every
+        landmark, so they also hold for the asymmetric graphs find_neighbours
+        can give.
+'''
+
+# Generic/Built-in Libs
+import heapq
+from math import sqrt, inf
+import numpy as np
+
+# Other imports
+from common import profile
+from model import MAX_DIST, CountryGraph
+from paths import _adjacency, _dijkstra
+
+
+class Router:
+    '''
+    Point-to-point distance queries between capitals with A*, optionally
+    guided by landmarks (ALT) found by preprocess().
+    '''
+
+    def __init__(self, graph, capitals, landmarks=0):
+        self.n = len(graph)
+        self.adjacency = _adjacency(graph)
+        self.xs = [cap.x for cap in capitals]
+        self.ys = [cap.y for cap in capitals]
+
+        # the largest scale of the straight line that stays below every
+        # edge's weight, lowered a little against rounding errors
+        sources = np.repeat(np.arange(self.n), np.diff(graph.offsets))
+        xs, ys = np.array(self.xs, dtype=np.float64), np.array(self.ys, dtype=np.float64)
+        lengths = np.hypot(xs[sources] - xs[graph.targets], ys[sources] - ys[graph.targets])
+        self.scale = float((graph.weights / lengths).min()) * (1 - 1e-9) if len(lengths) else 1.0
+
+        self.reverse = _adjacency(_reverse(graph))
+        self.preprocess(landmarks)
+        self.expansions = 0
+
+    def preprocess(self, landmarks):
+        '''
+        Picks the landmarks one by one, each as far as possible from the
+        ones picked before, and finds the distances from and to them.
+        '''
+        self.landmarks, from_landmark, to_landmark = [], [], []
+        self.from_landmark = self.to_landmark = None
+        if self.n == 0 or landmarks == 0:
+            return
+        # distance of every capital from the closest landmark
+        closest = _dijkstra(0, self.n, *self.adjacency, limit=inf)
+        for _ in range(min(landmarks, self.n)):
+            reachable = [(d, i) for i, d in enumerate(closest) if d != inf]
+            landmark = max(reachable)[1]
+            self.landmarks.append(landmark)
+            from_landmark.append(_dijkstra(landmark, self.n, *self.adjacency, limit=inf))
+            to_landmark.append(_dijkstra(landmark, self.n, *self.reverse, limit=inf))
+            closest = [min(a, b) for a, b in zip(closest, from_landmark[-1])]
+            closest[landmark] = 0
+        # landmarks x capitals, inf where there is no path
+        self.from_landmark = np.array(from_landmark, dtype=np.float64)
+        self.to_landmark = np.array(to_landmark, dtype=np.float64)
+
+    def distance(self, source, target):
+        '''
+        Returns the shortest distance from the source capital to the target
+        capital, MAX_DIST if it is MAX_DIST or more, like min_distance.
+        '''
+        offsets, targets, weights = self.adjacency
+        heuristic = self._heuristic(target)
+        if heuristic(source) == inf:
+            self.expansions = 0
+            return MAX_DIST
+        dist = {source: 0}
+        done = set()
+        unvisited = [(heuristic(source), source)]
+        expansions = 0
+
+        while unvisited:
+            _, c = heapq.heappop(unvisited)
+            if c in done:
+                continue
+            if c == target:
+                break
+            done.add(c)
+            expansions += 1
+
+            d = dist[c]
+            for e in range(offsets[c], offsets[c + 1]):
+                n_country = targets[e]
+                new_dist = d + weights[e]
+                if new_dist < dist.get(n_country, MAX_DIST):
+                    h = heuristic(n_country)
+                    if h == inf:
+                        continue
+                    dist[n_country] = new_dist
+                    heapq.heappush(unvisited, (new_dist + h, n_country))
+
+        self.expansions = expansions
+        profile.count('astar_expansions', expansions)
+        return dist.get(target, MAX_DIST)
+
+    def _heuristic(self, target):
+        '''
+        Returns the function giving a lower bound of the distance from a
+        capital to the target, inf if the target can not be reached.
+        '''
+        tx, ty, scale = self.xs[target], self.ys[target], self.scale
+        xs, ys = self.xs, self.ys
+        if not self.landmarks:
+            return lambda c: scale * sqrt((xs[c] - tx) ** 2 + (ys[c] - ty) ** 2)
+
+        # d(c, t) >= d(l, t) - d(l, c) and d(c, t) >= d(c, l) - d(t, l),
+        # found for all the capitals at once
+        with np.errstate(invalid='ignore'):
+            bounds = np.concatenate((self.from_landmark[:, target, None] - self.from_landmark,
+                                     self.to_landmark - self.to_landmark[:, target, None]))
+        h = np.nan_to_num(bounds, nan=-inf).max(axis=0).tolist()
+        return lambda c: max(h[c], scale * sqrt((xs[c] - tx) ** 2 + (ys[c] - ty) ** 2))
+
+
+def _reverse(graph):
+    '''Returns the graph with every edge turned around.'''
+    n = len(graph)
+    sources = np.repeat(np.arange(n), np.diff(graph.offsets))
+    order = np.lexsort((sources, graph.targets))
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(graph.targets, minlength=n), out=offsets[1:])
+    return CountryGraph(offsets, sources[order], graph.weights[order])
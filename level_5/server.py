@@ -0,0 +1,205 @@
+'''
+    Note:
+        - The protocol is one JSON object per line both ways. A request
+        is {"id": any, "query": "costs" | "best" | "top", "solars":
+        [[country, price], ...], "k": n} or {"id": any, "query":
+        "reload", "input": path}, every response carries the request's id
+        and either the result or an "error".
+        - Queries are answered from the map loaded last, a reload builds
+        the new map in a thread and swaps it in once it is complete, so
+        clients are never blocked by it.
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, os
+import json
+import signal
+import asyncio
+from collections import namedtuple
+import numpy as np
+
+# Other imports
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.reader import read_ints
+from model import Matrix, cost_matrix, cheapest_solars
+from paths import all_pairs
+from artifacts import ArtifactCache, map_key
+
+# Longest request line accepted, in bytes
+MAX_LINE = 1 << 26
+
+LoadedMap = namedtuple('LoadedMap', ['input', 'capitals', 'graph', 'distances'])
+
+
+def load_map(input_f, artifacts=None, workers=1):
+    '''
+    Reads the map block of a level 5 input file (the solars are ignored)
+    and finds the capitals, country graph and all the distances.
+    '''
+    icparsed = read_ints(input_f)
+    k = int(icparsed[0])
+    rows, cols = int(icparsed[k*2+1]), int(icparsed[k*2+2])
+
+    key = map_key(icparsed, k, rows, cols) if artifacts else None
+    cached = artifacts.load(key) if artifacts else None
+    if cached:
+        return LoadedMap(input_f, *cached)
+
+    cells = icparsed[k*2+3:k*2+3 + rows*cols*2].reshape(cols, rows, 2)
+    matrix = Matrix.from_planes(cells[:, :, 0], cells[:, :, 1])
+    capitals, _ = matrix.find_capitals()
+    graph = matrix.find_neighbours(capitals)
+    distances = all_pairs(graph, workers)
+    if artifacts:
+        artifacts.store(key, capitals, graph, distances)
+    return LoadedMap(input_f, capitals, graph, distances)
+
+
+def answer(loaded, request):
+    '''Returns the response to one query about the loaded map.'''
+    query = request.get('query', 'costs')
+    solars = np.asarray(request.get('solars', []), dtype=np.int64).reshape(-1, 2)
+    solar_countries, prices = solars[:, 0], solars[:, 1]
+    n = len(loaded.capitals)
+    if len(solars) and (solar_countries.min() < 0 or solar_countries.max() >= n):
+        raise ValueError('country ids must be in [0, {}]'.format(n - 1))
+
+    if query == 'costs':
+        # one row per capital, one column per solar
+        return {'costs': cost_matrix(loaded.distances, solar_countries, prices).tolist()}
+    if query == 'best':
+        # the cheapest solar of every capital
+        if not len(solars):
+            raise ValueError('no solars to choose from')
+        solars, costs = cheapest_solars(loaded.distances, solar_countries, prices, 1)
+        return {'solars': solars[:, 0].tolist(), 'costs': costs[:, 0].tolist()}
+    if query == 'top':
+        k = int(request['k'])
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        solars, costs = cheapest_solars(loaded.distances, solar_countries, prices, k)
+        return {'solars': solars.tolist(), 'costs': costs.tolist()}
+    raise ValueError('unknown query: ' + str(query))
+
+
+class QueryServer:
+    '''
+    Serves the queries of any number of concurrent clients about one
+    resident map.
+    '''
+
+    def __init__(self, input_f, artifacts=None, workers=1):
+        self.artifacts = artifacts
+        self.workers = workers
+        self.loaded = load_map(input_f, artifacts, workers)
+        self.reloading = None
+
+    async def reload(self, input_f=None):
+        '''
+        Loads the map again (from input_f if given) and swaps it in.
+        Concurrent reloads share one load.
+        '''
+        if self.reloading is None:
+            loop = asyncio.get_running_loop()
+            self.reloading = loop.run_in_executor(
+                None, load_map, input_f or self.loaded.input, self.artifacts, self.workers)
+            try:
+                self.loaded = await self.reloading
+            finally:
+                self.reloading = None
+        else:
+            await self.reloading
+        return self.loaded
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._respond(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('a request must be a JSON object')
+            request_id = request.get('id')
+            if request.get('query') == 'reload':
+                loaded = await self.reload(request.get('input'))
+                response = {'input': loaded.input, 'countries': len(loaded.capitals)}
+            else:
+                # answered in a thread, so other clients are served meanwhile
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(None, answer, self.loaded, request)
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            response = {'error': str(e)}
+        response['id'] = request_id
+        return response
+
+    async def serve(self, socket_path=None, port=None):
+        '''Serves on the Unix socket, or on localhost:port, until cancelled.'''
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle, socket_path, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.handle, '127.0.0.1', port, limit=MAX_LINE)
+        # SIGHUP reloads the map from its file
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(self.reload()))
+        async with server:
+            await server.serve_forever()
+
+
+def _get_arguments(argv):
+    """Parses the command-line arguments."""
+    inputfilepath = None
+    socket_path = None
+    port = None
+    artifacts = None
+    workers = 1
+    try:
+        opts, args = getopt.getopt(argv,"i:h",["socket=", "port=", "artifacts=", "workers="])
+    except getopt.GetoptError:
+        print('Usage: server.py -i <inputfilepath> --socket <path> | --port <n> --artifacts <dir> --workers <n> -h')
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print('Usage: server.py -i <inputfilepath> --socket <path> | --port <n> --artifacts <dir> --workers <n>')
+            sys.exit()
+        elif opt == '-i':
+            inputfilepath = arg
+        elif opt == '--socket':
+            socket_path = arg
+        elif opt == '--port':
+            port = int(arg)
+        elif opt == '--artifacts':
+            artifacts = arg
+        elif opt == '--workers':
+            workers = int(arg)
+    if inputfilepath is None or (socket_path is None and port is None):
+        print('ERROR.')
+        print('Usage: server.py -i <inputfilepath> --socket <path> | --port <n> --artifacts <dir> --workers <n> -h')
+        sys.exit()
+
+    return inputfilepath, socket_path, port, artifacts, workers
+
+
+def main(argv):
+    inputfilepath, socket_path, port, artifacts, workers = _get_arguments(argv)
+    server = QueryServer(inputfilepath, ArtifactCache(artifacts) if artifacts != None else None, workers)
+    print('Serving {} ({} countries)'.format(inputfilepath, len(server.loaded.capitals)), file=sys.stderr)
+    try:
+        asyncio.run(server.serve(socket_path, port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
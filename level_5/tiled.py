@@ -0,0 +1,213 @@
+'''
+    Note:
+        - The map is converted once into a .npy file of shape
+        (cols, rows, 2) int32, [y, x] -> (altitude, country), and then
+        read through a memory map one band of lines at a time. Only the
+        band, one line above and below it and the per-country state are
+        in memory.
+        - The results are the same capitals and CountryGraph that Matrix
+        gives for the whole map.
+'''
+
+# Generic/Built-in Libs
+import os
+import tempfile
+import numpy as np
+
+# Other imports
+from common.reader import iter_ints
+from model import Cell, CountryGraph
+
+# Number of cells in a band of lines processed at once
+BAND_CELLS = 1 << 20
+
+# Size of the blocks of the input read while looking for the header
+HEADER_CHUNK = 1 << 16
+
+# Pairs of countries are encoded as country * PAIR_BASE + neighbour until
+# the number of countries is known
+PAIR_BASE = 1 << 31
+
+# Closest cell code of a country without an interior cell
+_NONE = np.iinfo(np.int64).max
+
+
+def read_header(input_f):
+    '''
+    Returns the solars' countries and prices and the size of the map of a
+    level 5 input file, reading only the start of the file.
+    '''
+    head = np.zeros(0, dtype=np.int64)
+    for ints in iter_ints(input_f, HEADER_CHUNK):
+        head = np.concatenate((head, ints))
+        if len(head) and len(head) >= int(head[0]) * 2 + 3:
+            break
+    k = int(head[0])
+    solars = head[1:k*2+1].reshape(k, 2)
+    return solars[:, 0], solars[:, 1], int(head[k*2+1]), int(head[k*2+2])
+
+
+def convert_map(input_f, map_f):
+    '''
+    Writes the map block of a level 5 input file into map_f as a .npy
+    array, streaming the input one block at a time. The array is written
+    to a temporary file which then replaces map_f, so map_f is never left
+    partly written. Raises ValueError if the input has too few cells.
+    '''
+    _, _, rows, cols = read_header(input_f)
+    fd, tmp = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(os.path.abspath(map_f)))
+    os.close(fd)
+    try:
+        cells = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.int32, shape=(cols, rows, 2))
+        flat = cells.reshape(-1)
+
+        skip, written = None, 0
+        for ints in iter_ints(input_f):
+            if skip is None:
+                skip = int(ints[0]) * 2 + 3
+            # the solars and the size come before the cells
+            taken = min(skip, len(ints))
+            ints, skip = ints[taken:], skip - taken
+            ints = ints[:len(flat) - written]
+            flat[written:written + len(ints)] = ints
+            written += len(ints)
+        cells.flush()
+        del cells, flat
+        if written != rows * cols * 2:
+            raise ValueError('the map of {} has {} of its {} values'.format(input_f, written, rows * cols * 2))
+        os.replace(tmp, map_f)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def map_path(input_f):
+    '''
+    Returns the .npy map of the input file, converting it first if it is
+    missing or older than the input.
+    '''
+    map_f = input_f + '.map.npy'
+    if not os.path.exists(map_f) or os.path.getmtime(map_f) < os.path.getmtime(input_f):
+        convert_map(input_f, map_f)
+    return map_f
+
+
+class TiledMap:
+    '''
+    Finds the capitals and the country graph of a map stored in a .npy
+    file without loading it whole.
+    '''
+
+    def __init__(self, map_f, band_lines=None):
+        self.cells = np.load(map_f, mmap_mode='r')
+        self.cols, self.rows = self.cells.shape[:2]
+        self.band_lines = band_lines or max(1, BAND_CELLS // max(self.rows, 1))
+
+    def find_capitals_and_neighbours(self):
+        '''Returns the capitals and the CountryGraph, like Matrix does.'''
+        sizes, sum_x, sum_y, pairs = self._first_pass()
+        n = len(sizes)
+        avg_x, avg_y = sum_x // np.maximum(sizes, 1), sum_y // np.maximum(sizes, 1)
+
+        is_capital, closest = self._second_pass(n, avg_x, avg_y)
+        capitals = []
+        for i in range(n):
+            if is_capital[i]:
+                capitals.append(Cell(x=int(avg_x[i]), y=int(avg_y[i]), country=i, altitude=None))
+            elif closest[i] == _NONE:
+                capitals.append(None)
+            else:
+                rest, y = divmod(int(closest[i]), self.cols)
+                x = rest % self.rows
+                capitals.append(Cell(x=x, y=y, altitude=int(self.cells[y, x, 0]), country=i))
+
+        pairs = (pairs // PAIR_BASE) * n + pairs % PAIR_BASE
+        return capitals, CountryGraph.from_edges(n, pairs // n, pairs % n, capitals)
+
+    def _bands(self):
+        '''
+        Yields (first line, last line + 1, first halo line, countries) for
+        every band, the countries include one line of halo above and below
+        the band when there is one.
+        '''
+        for y0 in range(0, self.cols, self.band_lines):
+            y1 = min(y0 + self.band_lines, self.cols)
+            lo, hi = max(y0 - 1, 0), min(y1 + 1, self.cols)
+            yield y0, y1, lo, np.array(self.cells[lo:hi, :, 1], dtype=np.int64)
+
+    def _first_pass(self):
+        '''Per-country cell counts and coordinate sums, and the adjacent pairs.'''
+        sizes, sum_x, sum_y = (np.zeros(0, dtype=np.int64) for _ in range(3))
+        pairs = np.zeros(0, dtype=np.int64)
+        xs = np.arange(self.rows)
+        for y0, y1, lo, c in self._bands():
+            band = c[y0 - lo:y1 - lo]
+            countries = band.ravel()
+            ys = np.repeat(np.arange(y0, y1), self.rows)
+            n = max(len(sizes), int(countries.max()) + 1)
+            sizes = _add(sizes, np.bincount(countries, minlength=n))
+            sum_x = _add(sum_x, np.bincount(countries, weights=np.tile(xs, y1 - y0), minlength=n).astype(np.int64))
+            sum_y = _add(sum_y, np.bincount(countries, weights=ys, minlength=n).astype(np.int64))
+
+            # cells on the edge of the matrix are skipped
+            first, last = max(y0, 1), min(y1, self.cols - 1)
+            if first < last and self.rows > 2:
+                inner = c[first - lo:last - lo, 1:-1]
+                around = (c[first - lo:last - lo, :-2], c[first - lo:last - lo, 2:],
+                          c[first - lo - 1:last - lo - 1, 1:-1], c[first - lo + 1:last - lo + 1, 1:-1])
+                found = [pairs]
+                for shifted in around:
+                    differ = inner != shifted
+                    found.append(inner[differ] * PAIR_BASE + shifted[differ])
+                pairs = np.unique(np.concatenate(found))
+        return sizes, sum_x, sum_y, pairs
+
+    def _second_pass(self, n, avg_x, avg_y):
+        '''
+        Whether the average cell of every country is its capital, and the
+        closest interior cell of every country to its average cell,
+        encoded as (distance * rows + x) * cols + y so that the smallest
+        code breaks ties by x, then by y.
+        '''
+        is_capital = np.zeros(n, dtype=bool)
+        closest = np.full(n, _NONE, dtype=np.int64)
+        for y0, y1, lo, c in self._bands():
+            band = c[y0 - lo:y1 - lo]
+            border = _border(c, y0 - lo, y1 - lo, y0 == 0, y1 == self.cols)
+
+            # average cells that fall in this band
+            here = np.flatnonzero((avg_y >= y0) & (avg_y < y1))
+            cy, cx = avg_y[here] - y0, avg_x[here]
+            is_capital[here] = (band[cy, cx] == here) & ~border[cy, cx]
+
+            ys, x = np.nonzero(~border)
+            countries = band[ys, x]
+            y = ys + y0
+            dist = np.abs(x - avg_x[countries]) + np.abs(y - avg_y[countries])
+            np.minimum.at(closest, countries, (dist * self.rows + x) * self.cols + y)
+        return is_capital, closest
+
+
+def _add(total, part):
+    if len(part) > len(total):
+        total = np.concatenate((total, np.zeros(len(part) - len(total), dtype=np.int64)))
+    total[:len(part)] += part
+    return total
+
+
+def _border(c, start, end, top, bottom):
+    '''
+    Border mask of the lines c[start:end], c has the halo lines around
+    them. top and bottom tell if the first and last lines are the edges
+    of the map.
+    '''
+    band = c[start:end]
+    border = np.ones(band.shape, dtype=bool)
+    first = 1 if top else 0
+    last = len(band) - 1 if bottom else len(band)
+    if first < last and band.shape[1] > 2:
+        inner = band[first:last, 1:-1]
+        border[first:last, 1:-1] = ((inner != band[first:last, :-2]) | (inner != band[first:last, 2:]) |
+                                    (inner != c[start + first - 1:start + last - 1, 1:-1]) |
+                                    (inner != c[start + first + 1:start + last + 1, 1:-1]))
+    return border
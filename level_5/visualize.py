@@ -0,0 +1,41 @@
+'''
+    Note:
+        - matplotlib is imported only when a map is rendered, with the
+        non-interactive Agg backend, so importing this module is cheap.
+'''
+
+# Generic/Built-in Libs
+import os
+
+
+def render_map(input_f, rows, cols, capitals, graph):
+    '''
+    Renders the capitals and the connections between neighbouring
+    countries into the viz folder. The figure is closed once it is saved.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.grid(which='major', axis='both')
+    ax.set_xlim(0, rows-1)
+    ax.set_ylim(0, cols-1)
+
+    for capital in capitals:
+        ax.scatter(capital.x, capital.y, color='r')
+        ax.text(capital.x, capital.y, "Country:" + str(capital.country))
+        start, end = graph.offsets[capital.country], graph.offsets[capital.country + 1]
+        for neighbour, weight in zip(graph.targets[start:end].tolist(), graph.weights[start:end].tolist()):
+            n_capital = capitals[neighbour]
+            # plot again
+            ax.plot([capital.x, n_capital.x], [capital.y, n_capital.y], color='b')
+            # plot distance
+            x_avg, y_avg = (capital.x + n_capital.x) / 2, (capital.y + n_capital.y) / 2
+            ax.text(x_avg, y_avg, weight)
+    ax.set_title('input: \'' + input_f + '\'')
+
+    if not os.path.exists('./viz'):
+        os.mkdir('./viz')
+    fig.savefig('./viz/' + input_f + '.png')
+    plt.close(fig)
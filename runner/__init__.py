@@ -0,0 +1,5 @@
+'''
+Runs a level's solution on many inputs in one pool of worker processes.
+
+    python -m runner.batch -l 5 -i <inputsdir> -o <outputsdir> --workers <n>
+'''
@@ -0,0 +1,164 @@
+'''
+Runs one level's solution on every input of a directory (every *.in file)
+or of a glob, in a pool of worker processes started once. Every worker
+imports the level's modules once and then solves one file after another,
+so numpy and the level are not imported again for every input.
+
+    python -m runner.batch -l <level> -i <inputsdir or glob> -o <outputsdir> --workers <n> -j <resultsfile>
+
+    Note:
+        - Only one level is imported per worker, both levels have their
+        own main and model modules.
+        - The solutions keep no state between calls, every input is
+        solved with the default options of its level.
+'''
+
+# Generic/Built-in Libs
+import sys, getopt, os, json, time, glob
+import multiprocessing
+
+# Other imports
+from common.writer import TimedWriter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEVEL_DIRS = {4: os.path.join(ROOT, 'level_4'), 5: os.path.join(ROOT, 'level_5')}
+
+# The level's main module, imported once by every worker
+_LEVEL_MAIN = None
+
+
+def find_inputs(pattern):
+    '''Returns the sorted *.in files of a directory, or the files matching a glob.'''
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.in')
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+
+def output_path(inputfilepath, outputs_dir=None):
+    '''Returns <input>.out, in outputs_dir if given.'''
+    if outputs_dir is None:
+        return inputfilepath + '.out'
+    return os.path.join(outputs_dir, os.path.basename(inputfilepath) + '.out')
+
+
+def _init_worker(level_dir):
+    global _LEVEL_MAIN
+
+    sys.path.insert(0, level_dir)
+    import main as level_main
+    _LEVEL_MAIN = level_main
+
+
+def _solve(job):
+    '''
+    Solves one input, returns its timings like benchmarks.phases, or the
+    error if it failed.
+    '''
+    inputfilepath, outputfilepath = job
+    result = {'input': inputfilepath, 'output': outputfilepath}
+    try:
+        start = time.perf_counter()
+        icparsed = _LEVEL_MAIN.read_ints(inputfilepath)
+        parse = time.perf_counter() - start
+
+        start = time.perf_counter()
+        out = TimedWriter(_LEVEL_MAIN.RowWriter(outputfilepath))
+        try:
+            _LEVEL_MAIN.solution(icparsed, out)
+        finally:
+            out.close()
+        solution = time.perf_counter() - start
+    except Exception as e:
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+        return result
+
+    result.update(parse=parse, compute=solution - out.seconds, write=out.seconds, total=parse + solution)
+    return result
+
+
+def run_batch(level, inputs, outputs_dir=None, workers=1, report=None):
+    '''
+    Solves every input in a pool of workers and returns the results of
+    every file, in the order of the inputs, and the summary. report is
+    called with every result as soon as its file is done.
+    '''
+    if outputs_dir is not None and not os.path.exists(outputs_dir):
+        os.makedirs(outputs_dir)
+    jobs = [(path, output_path(path, outputs_dir)) for path in inputs]
+
+    start = time.perf_counter()
+    results = {}
+    with multiprocessing.Pool(max(1, workers), _init_worker, (LEVEL_DIRS[level],)) as pool:
+        for result in pool.imap_unordered(_solve, jobs):
+            results[result['input']] = result
+            if report:
+                report(result)
+    seconds = time.perf_counter() - start
+
+    failed = sum(1 for result in results.values() if 'error' in result)
+    summary = {
+        'level': level,
+        'files': len(jobs),
+        'failed': failed,
+        'workers': workers,
+        'seconds': seconds,
+        'files_per_second': len(jobs) / seconds if seconds > 0 else 0.0,
+    }
+    return [results[path] for path in inputs], summary
+
+
+def _print_result(result):
+    if 'error' in result:
+        print('{}  FAILED  {}'.format(result['input'], result['error']), file=sys.stderr)
+    else:
+        print('{}  parse {:.3f}s  compute {:.3f}s  write {:.3f}s  total {:.3f}s'.format(
+            result['input'], result['parse'], result['compute'], result['write'], result['total']), file=sys.stderr)
+
+
+def main(argv):
+    level, pattern, outputs_dir, resultsfilepath = None, None, None, None
+    workers = os.cpu_count() or 1
+    usage = 'Usage: python -m runner.batch -l <level> -i <inputsdir or glob> -o <outputsdir> --workers <n> -j <resultsfile> -h'
+    try:
+        opts, args = getopt.getopt(argv, "l:i:o:j:h", ["workers="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == '-l':
+            level = int(arg)
+        elif opt == '-i':
+            pattern = arg
+        elif opt == '-o':
+            outputs_dir = arg
+        elif opt == '-j':
+            resultsfilepath = arg
+        elif opt == '--workers':
+            workers = int(arg)
+    if level not in LEVEL_DIRS or pattern is None:
+        print('ERROR.')
+        print(usage)
+        sys.exit(2)
+
+    inputs = find_inputs(pattern)
+    if not inputs:
+        print('ERROR. No input files found: ' + pattern)
+        sys.exit(2)
+
+    results, summary = run_batch(level, inputs, outputs_dir, workers, _print_result)
+    print('{} files in {:.3f}s with {} workers, {:.2f} files/s{}'.format(
+        summary['files'], summary['seconds'], summary['workers'], summary['files_per_second'],
+        ', {} failed'.format(summary['failed']) if summary['failed'] else ''), file=sys.stderr)
+
+    if resultsfilepath:
+        with open(resultsfilepath, 'w') as f:
+            f.write(json.dumps({'summary': summary, 'files': results}, indent=2))
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])